@@ -0,0 +1,51 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Decode cost per frame of the slave BitSequence types compared to the
+# precompiled decoders of vat_590.decoders.
+#
+#   python benchmarks/bench_decoders.py
+
+import timeit
+
+from vat_590.commands import VAT590Commands, decode_response
+from vat_590.decoders import DECODERS
+
+RESPONSES = {
+    'assembly': ['00050000001234150'],
+    'device_status': ['1500'],
+    'warnings': ['0000'],
+    'valve_configuration': ['00000000'],
+}
+
+
+def main(number=20000):
+    commands = VAT590Commands()
+
+    print('%-22s %14s %14s %8s' % ('frame', 'slave [us]', 'compiled [us]', 'speedup'))
+    for name, response in sorted(RESPONSES.items()):
+        cmd = getattr(commands, name)
+        decoder = DECODERS[name]
+
+        assert list(decode_response(cmd, response)) == list(decoder.decode(response))
+
+        before = min(timeit.repeat(lambda: decode_response(cmd, response), number=number, repeat=3)) / number
+        after = min(timeit.repeat(lambda: decoder.decode(response), number=number, repeat=3)) / number
+
+        print('%-22s %14.2f %14.2f %7.1fx' % (name, before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Frames per second through the encode/parse path of the protocol alone,
+# compared to the former str based framing.
+#
+#   python benchmarks/bench_framing.py
+
+import logging
+import timeit
+
+from vat_590.protocol import VAT590Framing
+
+FRAMES = [
+    ('P:', (), b'P:00001234'),
+    ('i:76', (), b'i:7600050000001234150'),
+    ('S:', ('00001000',), b'S:'),
+]
+
+
+def legacy_create_message(header, *data):
+    msg = []
+    msg.append(header)
+    msg.extend(data)
+    msg.append("\r\n")
+    return ''.join(msg).encode('ascii')
+
+
+def legacy_parse_response(response, header):
+    response = response.decode('ascii')
+
+    if response.startswith('E:'):
+        raise ValueError(response)
+
+    if not response.startswith(header[0]):
+        raise ValueError('Response header mismatch')
+
+    response = response[len(header):]
+    return response.split(None)
+
+
+def main(number=50000):
+    framing = VAT590Framing(logging.getLogger('bench'))
+
+    print('%-8s %14s %14s' % ('frame', 'legacy [1/s]', 'current [1/s]'))
+    for header, data, response in FRAMES:
+        def legacy():
+            legacy_create_message(header, *data)
+            legacy_parse_response(response, header)
+
+        def current():
+            framing.create_message(header, *data)
+            framing.parse_response(response, header)
+
+        assert legacy_create_message(header, *data) == framing.create_message(header, *data)
+        assert legacy_parse_response(response, header) == framing.parse_response(response, header)
+
+        before = min(timeit.repeat(legacy, number=number, repeat=7))
+        after = min(timeit.repeat(current, number=number, repeat=7))
+
+        print('%-8s %14.0f %14.0f' % (header, number / before, number / after))
+
+
+if __name__ == '__main__':
+    main()
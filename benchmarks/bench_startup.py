@@ -0,0 +1,78 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Startup cost of the package: importing vat_590.factory and creating N
+# drivers with VAT590Factory.create, in a fresh interpreter per run.
+#
+#   python benchmarks/bench_startup.py --drivers 1000
+
+import argparse
+import json
+import subprocess
+import sys
+
+# runs in a fresh interpreter, such that the import is not cached
+SCRIPT = '''
+import json, logging, time, tracemalloc
+
+tracemalloc.start()
+start = time.perf_counter()
+from vat_590.factory import VAT590Factory
+imported = time.perf_counter()
+import_bytes = tracemalloc.get_traced_memory()[0]
+
+# not part of the measured import
+from vat_590.emulator import VAT590EmulatorTransport
+
+logger = logging.getLogger('vat_590.benchmarks')
+logger.addHandler(logging.NullHandler())
+transport = VAT590EmulatorTransport(realtime=False)
+
+before = tracemalloc.get_traced_memory()[0]
+created = time.perf_counter()
+drivers = [VAT590Factory.create(transport, logger) for _ in range(%(drivers)d)]
+done = time.perf_counter()
+driver_bytes = tracemalloc.get_traced_memory()[0] - before
+
+print(json.dumps({
+    'import_ms': (imported - start) * 1e3,
+    'import_kib': import_bytes / 1024.0,
+    'create_us': (done - created) * 1e6 / len(drivers),
+    'driver_bytes': driver_bytes / float(len(drivers)),
+}))
+'''
+
+
+def run(drivers):
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT % {'drivers': drivers}])
+    return json.loads(output.decode('ascii').splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import and driver construction cost')
+    parser.add_argument('--drivers', type=int, default=1000, help='drivers to create per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs, the fastest is reported')
+    args = parser.parse_args(argv)
+
+    results = [run(args.drivers) for _ in range(args.repeat)]
+
+    print('import vat_590.factory  %8.1f ms  %8.1f KiB' % (min(r['import_ms'] for r in results),
+                                                         min(r['import_kib'] for r in results)))
+    print('VAT590Factory.create    %8.1f us  %8.0f bytes per driver, %d drivers' % (
+        min(r['create_us'] for r in results), min(r['driver_bytes'] for r in results), args.drivers))
+
+
+if __name__ == '__main__':
+    main()
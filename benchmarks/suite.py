@@ -0,0 +1,203 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmarks of the driver and protocol hot paths against a scripted
+# in-memory transport. Reports operations per second and allocations per
+# operation, and writes the results as JSON to compare runs, e.g. before
+# and after an upgrade of slave or e21_util:
+#
+#   python benchmarks/suite.py --output before.json
+#   python benchmarks/suite.py --output after.json --compare before.json
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+
+from e21_util.serial_connection import AbstractTransport, SerialTimeoutException
+
+from vat_590.factory import VAT590Factory
+from vat_590.protocol import VAT590Framing
+
+# responses of the scripted transport by request frame
+RESPONSES = {
+    b'P:\r\n': b'P:00001234\r\n',
+    b'A:\r\n': b'A:000500\r\n',
+    b'i:76\r\n': b'i:7600050000001234150\r\n',
+    b'i:30\r\n': b'i:301500\r\n',
+    b'i:51\r\n': b'i:510000\r\n',
+    b'i:50\r\n': b'i:5000000000\r\n',
+    b'i:21\r\n': b'i:2120100000\r\n',
+    b'i:01\r\n': b'i:0111000000\r\n',
+    b'i:02\r\n': b'i:02000000\r\n',
+    b'i:04\r\n': b'i:0400000000\r\n',
+    b'i:20\r\n': b'i:2044100000\r\n',
+    b'i:60\r\n': b'i:600000000\r\n',
+    b'i:64\r\n': b'i:640001234\r\n',
+    b'i:68\r\n': b'i:68001000\r\n',
+    b'i:82\r\n': b'i:821213\r\n',
+    b'i:83\r\n': b'i:83VAT590\r\n',
+    b'i:84\r\n': b'i:84590.0\r\n',
+}
+
+GETTERS = [
+    'get_pressure', 'get_position', 'get_assembly', 'get_device_status', 'get_warnings',
+    'get_errors', 'get_sensor_offset', 'get_sensor_reading', 'get_speed',
+    'get_range_configuration', 'get_sensor_configuration', 'get_valve_configuration',
+    'get_interface_configuration', 'get_pid_controller', 'get_identification',
+    'get_firmware_configuration', 'get_firmware_number',
+]
+
+
+class ScriptedTransport(AbstractTransport):
+    """Answers every frame instantly from RESPONSES, writes are echoed by their header."""
+
+    def __init__(self):
+        super(ScriptedTransport, self).__init__()
+        self._buffer = bytearray()
+
+    def write(self, data):
+        for frame in bytes(data).split(b'\r\n')[:-1]:
+            frame += b'\r\n'
+            response = RESPONSES.get(frame)
+            if response is None:
+                response = frame[:frame.index(b':') + 1] + b'\r\n'
+            self._buffer.extend(response)
+
+    def read_bytes(self, num_bytes):
+        if not self._buffer:
+            raise SerialTimeoutException()
+        data = bytes(self._buffer[:num_bytes])
+        del self._buffer[:num_bytes]
+        return data
+
+    def read_until(self, delimiter):
+        if not isinstance(delimiter, bytes):
+            delimiter = delimiter.encode('ascii')
+
+        index = self._buffer.find(delimiter)
+        if index < 0:
+            raise SerialTimeoutException()
+
+        end = index + len(delimiter)
+        data = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return data
+
+
+def _logger():
+    logger = logging.getLogger('vat_590.benchmarks')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+def benchmarks():
+    logger = _logger()
+    transport = ScriptedTransport()
+    framing = VAT590Framing(logger)
+
+    # the uncached driver measures the register reads, not the cache
+    driver = VAT590Factory.create(transport, logger)
+    uncached = VAT590Factory.create(ScriptedTransport(), logger)
+    uncached._cache_configuration = False
+
+    cases = [
+        ('factory.create', lambda: VAT590Factory.create(transport, logger)),
+        ('framing.create_message', lambda: framing.create_message('i:76')),
+        ('framing.create_message_data', lambda: framing.create_message('S:', '00001000')),
+        ('framing.parse_response', lambda: framing.parse_response(b'i:7600050000001234150', 'i:76')),
+        ('protocol.query', lambda: driver._protocol.query(transport, 'P:')),
+        ('protocol.write', lambda: driver._protocol.write(transport, 'H:', '')),
+        ('driver.query_many', lambda: driver.query_many(['get_pressure', 'get_position', 'get_device_status',
+                                                         'get_warnings', 'get_errors'])),
+        ('driver.set_pressure', lambda: driver.set_pressure(1000)),
+        ('driver.set_position', lambda: driver.set_position(500)),
+    ]
+
+    for getter in GETTERS:
+        cases.append(('driver.' + getter, getattr(uncached, getter)))
+
+    return cases
+
+
+def measure(function, duration):
+    # allocations of one call, after a warm up call
+    function()
+    tracemalloc.start()
+    function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    blocks = sys.getallocatedblocks()
+    number = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration:
+        for _ in range(100):
+            function()
+        number += 100
+        elapsed = time.perf_counter() - start
+
+    return {
+        'ops_per_sec': number / elapsed,
+        'peak_bytes': peak,
+        'retained_blocks': float(sys.getallocatedblocks() - blocks) / number,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the driver and protocol hot paths')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--filter', default='', help='run only benchmarks containing this string')
+    parser.add_argument('--duration', type=float, default=0.5, help='seconds per benchmark')
+    args = parser.parse_args(argv)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+
+    results = {}
+    print('%-40s %14s %12s %10s %9s' % ('benchmark', 'ops/s', 'peak bytes', 'retained', 'change'))
+    for name, function in benchmarks():
+        if args.filter not in name:
+            continue
+
+        result = results[name] = measure(function, args.duration)
+
+        change = ''
+        if name in previous:
+            change = '%+.1f%%' % (100.0 * (result['ops_per_sec'] / previous[name]['ops_per_sec'] - 1))
+
+        print('%-40s %14.0f %12d %10.2f %9s' % (name, result['ops_per_sec'], result['peak_bytes'],
+                                               result['retained_blocks'], change))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.time(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,5 +26,7 @@ setup(
     long_description=open('README.md').read(),
     packages=find_packages(),
     include_package_data=True,
+    python_requires='>=3.8',
     install_requires=['slave', 'e21_util'],
+    extras_require={'numpy': ['numpy']},
 )
@@ -0,0 +1,55 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+import pytest
+
+from vat_590.emulator import VAT590Emulator, VAT590EmulatorTransport
+from vat_590.factory import VAT590Factory
+
+
+class RecordingTransport(VAT590EmulatorTransport):
+    """Keeps the frames written to the emulator."""
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingTransport, self).__init__(*args, **kwargs)
+        self.frames = []
+
+    def write(self, data):
+        self.frames.extend(frame + b'\r\n' for frame in bytes(data).split(b'\r\n')[:-1])
+        return super(RecordingTransport, self).write(data)
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger('vat_590.tests')
+    logger.addHandler(logging.NullHandler())
+    return logger
+
+
+@pytest.fixture
+def emulator():
+    return VAT590Emulator()
+
+
+@pytest.fixture
+def transport(emulator):
+    return RecordingTransport(emulator, realtime=False)
+
+
+@pytest.fixture
+def driver(transport, logger):
+    return VAT590Factory.create(transport, logger)
@@ -0,0 +1,44 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from vat_590.commands import default_commands, decode_response
+from vat_590.decoders import DECODERS
+
+STATES = [
+    {},
+    {'status': '2', 'access_mode': '00'},
+    {'status': '6', 'access_mode': '02', 'warnings': '1010'},
+    {'status': '7', 'warnings': '0101', 'valve_configuration': '10111011'},
+]
+
+
+@pytest.mark.parametrize('name', sorted(DECODERS))
+@pytest.mark.parametrize('state', STATES)
+def test_decoders_match_the_slave_types(name, state, emulator, driver, transport):
+    for key, value in state.items():
+        setattr(emulator, key, value)
+
+    decoder = DECODERS[name]
+    response = driver._protocol.query(transport, decoder.header)
+
+    # the slave types return a list of the fields
+    assert list(decoder.decode(response)) == decode_response(getattr(default_commands(), name), response)
+
+
+def test_decoders_reject_malformed_responses():
+    with pytest.raises(ValueError):
+        DECODERS['device_status'].decode(['15'])
@@ -0,0 +1,51 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from e21_util.error import ErrorResponse
+
+from vat_590.events import VAT590EventMonitor
+from vat_590.jobs import VAT590JobRunner
+
+
+@pytest.fixture
+def runner(driver, logger):
+    monitor = VAT590EventMonitor.for_driver(driver, logger, rates={'device_status': 50})
+    with monitor:
+        yield VAT590JobRunner(driver, monitor, logger)
+
+
+def test_learn_finishes(runner, emulator):
+    emulator.learn_duration = 0.1
+
+    assert runner.learn(1000, timeout=5).result(timeout=5) == 'Position control'
+    assert runner.get_jobs() == []
+
+
+def test_rejected_learn_fails_right_away(runner, emulator):
+    emulator.access_mode = '00'
+
+    job = runner.learn(1000)
+    assert job.done()
+    assert isinstance(job.exception(), ErrorResponse)
+    assert runner.get_jobs() == []
+
+
+def test_invalid_setpoint_is_not_sent(runner, transport):
+    with pytest.raises(ValueError):
+        runner.pressure_alignment(-1)
+
+    assert not [frame for frame in transport.frames if frame[:2] == b'c:']
@@ -0,0 +1,90 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from e21_util.error import CommunicationError, ErrorResponse
+
+from vat_590.emulator import VAT590EmulatorTransport
+from vat_590.factory import VAT590Factory
+
+
+def test_resync_drops_stale_frames(driver, emulator):
+    driver.enable_resync()
+    # the response of an earlier exchange arrives before the one of P:
+    emulator.inject(b'A:000500\r\nP:00001000\r\n')
+
+    assert driver.get_pressure() == 1000
+    assert driver.get_position() == 0
+
+
+def test_resync_cuts_garbage_before_the_header(driver, emulator):
+    driver.enable_resync()
+    emulator.inject(b'\x00xP:00002000\r\n')
+
+    assert driver.get_pressure() == 2000
+
+
+def test_resync_gives_up_after_max_skipped(driver, emulator):
+    driver.enable_resync(retries=0, max_skipped=1)
+    emulator.inject(b'A:000500\r\nA:000500\r\nA:000500\r\n')
+
+    with pytest.raises(CommunicationError):
+        driver.get_pressure()
+
+
+def test_stale_frame_without_resync_is_a_mismatch(driver, emulator):
+    emulator.inject(b'A:000500\r\n')
+
+    with pytest.raises(ValueError):
+        driver.get_pressure()
+
+
+def test_query_many_pipelines_at_most_max_pipelined_frames(driver, transport):
+    writes = []
+    write = transport.write
+    transport.write = lambda data: (writes.append(data.count(b'\r\n')), write(data))
+
+    assert len(driver.query_many(['get_pressure'] * 9)) == 9
+    assert writes == [4, 4, 1]
+
+
+def test_write_acknowledged_raises_on_error_response(driver, emulator):
+    emulator.access_mode = '00'
+
+    with pytest.raises(ErrorResponse):
+        driver._write_checked('close', '')
+
+
+def test_retry_does_not_take_the_late_response(emulator, logger):
+    transport = VAT590EmulatorTransport(emulator, baud_rate=115200, timeout=0.05)
+    driver = VAT590Factory.create(transport, logger)
+    driver.enable_resync()
+
+    # only the response to the first attempt is late
+    write = transport.write
+
+    def late_once(data):
+        write(data)
+        transport.latency = 0.0
+
+    transport.latency = 0.08
+    transport.write = late_once
+    driver.get_pressure()
+
+    # the queued response to the retry would still read the old pressure
+    emulator.pressure_tau = 1e9
+    emulator.pressure = 1234.0
+    assert driver.get_pressure() == 1234
@@ -0,0 +1,64 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import pytest
+
+from e21_util.error import ErrorResponse
+
+from vat_590.decoders import DeviceStatus
+from vat_590.server import VAT590Server, VAT590Client
+
+
+@pytest.fixture
+def client(driver, logger, tmp_path):
+    path = str(tmp_path / 'vat590.sock')
+    with VAT590Server(driver, path, logger):
+        with VAT590Client(path, timeout=5) as client:
+            yield client
+
+    assert not os.path.exists(path)
+
+
+def test_round_trip(client, emulator):
+    assert client.get_pressure() == round(emulator.pressure)
+    assert client.get_identification() == emulator.identification
+
+    client.set_position(1000)
+    assert emulator.status == '2'
+
+
+def test_records_and_errors_of_query_many(client, emulator):
+    status, pressure = client.query_many(['get_device_status', 'get_pressure'])
+    assert isinstance(status, DeviceStatus)
+    assert status.status == 'Closed'
+
+    emulator.inject(b'E:000020\r\n')
+    error, position = client.query_many(['get_pressure', 'get_position'], False)
+    assert isinstance(error, ErrorResponse)
+    assert position == 0
+
+
+def test_errors_are_raised_by_the_client(client, emulator):
+    emulator.inject(b'E:000020\r\n')
+    with pytest.raises(ErrorResponse):
+        client.get_pressure()
+
+    with pytest.raises(ValueError):
+        client.call('dump_trace', '/tmp/trace.bin')
+
+    # the connection stays usable
+    assert client.get_position() == 0
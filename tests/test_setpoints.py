@@ -0,0 +1,87 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from e21_util.error import ErrorResponse
+
+
+def _setpoints(transport):
+    return [frame for frame in transport.frames if frame[:2] in (b'S:', b'R:')]
+
+
+def test_acknowledged_setpoint_is_not_written_again(driver, transport):
+    driver.enable_write_behind()
+    try:
+        driver.set_pressure(5000)
+        driver.flush_setpoints()
+        assert driver.get_acknowledged_setpoint() == ('pressure', 5000)
+
+        driver.set_pressure(5000)
+        assert driver.get_pending_setpoint() is None
+        driver.flush_setpoints()
+        assert _setpoints(transport) == [b'S:00005000\r\n']
+    finally:
+        driver.disable_write_behind()
+
+
+def test_newest_setpoint_replaces_the_pending_one(driver, transport):
+    driver.enable_write_behind(max_rate=0.001)
+    try:
+        # the first one is written right away, the rate limit holds back the others
+        driver.set_position(100)
+        driver.set_position(200)
+        driver.set_pressure(3000)
+        assert driver.get_pending_setpoint() == ('pressure', 3000)
+
+        driver.flush_setpoints()
+        assert _setpoints(transport)[-1] == b'S:00003000\r\n'
+        assert b'R:000200\r\n' not in _setpoints(transport)
+    finally:
+        driver.disable_write_behind()
+
+
+def test_rejected_setpoint_is_not_acknowledged(driver, emulator, transport):
+    driver.enable_write_behind()
+    try:
+        emulator.access_mode = '00'
+        driver.set_pressure(5000)
+        with pytest.raises(ErrorResponse):
+            driver.flush_setpoints()
+        assert driver.get_acknowledged_setpoint() is None
+
+        # sent again once the valve accepts it
+        emulator.access_mode = '01'
+        driver.set_pressure(5000)
+        driver.flush_setpoints()
+        assert driver.get_acknowledged_setpoint() == ('pressure', 5000)
+        assert _setpoints(transport) == [b'S:00005000\r\n', b'S:00005000\r\n']
+    finally:
+        driver.disable_write_behind()
+
+
+def test_other_writes_invalidate_the_acknowledged_setpoint(driver, transport):
+    driver.enable_write_behind()
+    try:
+        driver.set_position(100)
+        driver.flush_setpoints()
+        driver.close()
+        assert driver.get_acknowledged_setpoint() is None
+
+        driver.set_position(100)
+        driver.flush_setpoints()
+        assert _setpoints(transport) == [b'R:000100\r\n', b'R:000100\r\n']
+    finally:
+        driver.disable_write_behind()
@@ -0,0 +1,81 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from vat_590.singleflight import SingleFlight
+
+
+def _share(flight, function, followers=3):
+    # the leader blocks until the followers called do, returns the outcomes of all calls
+    started = threading.Event()
+    arrived = threading.Semaphore(0)
+    outcomes = []
+
+    def leader():
+        started.set()
+        for _ in range(followers):
+            arrived.acquire()
+        # the followers are waiting within do by now
+        time.sleep(0.1)
+        return function()
+
+    def duplicate():
+        raise AssertionError('executed twice')
+
+    def call(target, follower):
+        if follower:
+            arrived.release()
+        try:
+            outcomes.append(('value', flight.do('key', target)))
+        except Exception as e:
+            outcomes.append(('error', e))
+
+    threads = [threading.Thread(target=call, args=(leader, False))]
+    threads[0].start()
+    started.wait(5)
+
+    for _ in range(followers):
+        threads.append(threading.Thread(target=call, args=(duplicate, True)))
+        threads[-1].start()
+
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_calls_share_the_result():
+    executed = []
+    outcomes = _share(SingleFlight(), lambda: executed.append(1) or 42)
+
+    assert executed == [1]
+    assert outcomes == [('value', 42)] * 4
+
+
+def test_concurrent_calls_share_the_exception():
+    error = ValueError('failed')
+
+    def fail():
+        raise error
+
+    outcomes = _share(SingleFlight(), fail)
+    assert outcomes == [('error', error)] * 4
+
+
+def test_later_calls_execute_again():
+    flight = SingleFlight()
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
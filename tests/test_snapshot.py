@@ -0,0 +1,54 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from vat_590.snapshot import take_snapshot, diff_snapshot, restore_snapshot
+
+
+def _writes(transport):
+    return [frame for frame in transport.frames if frame[:2] == b's:']
+
+
+def test_unchanged_valve_has_no_difference(driver):
+    snapshot = take_snapshot(driver)
+
+    assert snapshot['identification'] == 'VAT590-EMULATOR'
+    assert diff_snapshot(driver, snapshot) == {}
+    assert restore_snapshot(driver, snapshot) == []
+
+
+def test_restore_writes_only_the_changed_registers(driver, emulator, transport):
+    snapshot = take_snapshot(driver)
+    emulator.valve_configuration = '10000000'
+    emulator.range_configuration = '10010000'
+
+    differences = diff_snapshot(driver, snapshot)
+    assert list(differences.keys()) == ['valve_configuration', 'range_configuration']
+    assert differences['valve_configuration'][0]['valve_power_up'] == 'open'
+    assert differences['valve_configuration'][1]['valve_power_up'] == 'close'
+
+    del transport.frames[:]
+    assert restore_snapshot(driver, snapshot) == ['valve_configuration', 'range_configuration']
+    assert _writes(transport) == [b's:0400000000\r\n', b's:2120100000\r\n']
+
+    assert emulator.valve_configuration == '00000000'
+    assert emulator.range_configuration == '20100000'
+    assert diff_snapshot(driver, snapshot) == {}
+
+
+def test_restore_rejects_unknown_registers(driver):
+    with pytest.raises(ValueError):
+        restore_snapshot(driver, take_snapshot(driver), ['unknown'])
@@ -0,0 +1,245 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from slave.driver import Command
+
+from vat_590.async_protocol import AsyncVAT590Protocol
+from vat_590.commands import default_commands, query_request, write_request, decode_response
+from vat_590.decoders import decoders_for
+from vat_590.driver import VAT590Driver
+
+
+class AsyncVAT590Driver(object):
+    """
+    asyncio flavour of VAT590Driver.
+
+    Offers the getters and setters of VAT590Driver, including the cache of
+    the configuration registers, but every method talking to the valve is a
+    coroutine. It is a subset: pipelining (query_many), statistics, resync,
+    trace, write-behind and trajectories are only offered by VAT590Driver.
+    """
+
+    CONFIGURATION_REGISTERS = VAT590Driver.CONFIGURATION_REGISTERS
+
+    RESET_WARNINGS = VAT590Driver.RESET_WARNINGS
+    RESET_FATAL_ERROR = VAT590Driver.RESET_FATAL_ERROR
+
+    ACCESS_MODE_LOCAL = VAT590Driver.ACCESS_MODE_LOCAL
+    ACCESS_MODE_REMOTE = VAT590Driver.ACCESS_MODE_REMOTE
+    ACCESS_MODE_LOCKED_REMOTE = VAT590Driver.ACCESS_MODE_LOCKED_REMOTE
+
+    RANGE_POSITION_1000 = VAT590Driver.RANGE_POSITION_1000
+    RANGE_POSITION_10000 = VAT590Driver.RANGE_POSITION_10000
+    RANGE_POSITION_100000 = VAT590Driver.RANGE_POSITION_100000
+
+    def __init__(self, protocol, commands=None, cache_configuration=True):
+        assert isinstance(protocol, AsyncVAT590Protocol)
+
+        self._protocol = protocol
+
+        if commands is None:
+            commands = default_commands()
+
+        self._commands = commands
+        self._decoders = decoders_for(commands)
+
+        self.PID_controller = commands.PID_controller
+        self.interface_config = commands.interface_config
+
+        self._cache_configuration = cache_configuration
+        self._config_cache = {}
+        self._config_generation = 0
+
+    async def clear(self):
+        await self._protocol.clear()
+
+    async def _query(self, cmd):
+        if not isinstance(cmd, Command):
+            raise TypeError("Can only query on Command")
+
+        header, data = query_request(cmd)
+        response = await self._protocol.query(header, *data)
+        return decode_response(cmd, response)
+
+    async def _query_register(self, name):
+        decoder = self._decoders.get(name)
+        if decoder is None:
+            return await self._query(getattr(self._commands, name))
+
+        return decoder.decode(await self._protocol.query(decoder.header))
+
+    async def _write(self, cmd, *datas):
+        if not isinstance(cmd, Command):
+            cmd = Command(write=cmd)
+
+        header, data = write_request(cmd, *datas)
+        await self._protocol.write(header, *data)
+
+    async def _query_configuration(self, name):
+        if name in self._config_cache:
+            return self._copy(self._config_cache[name])
+        generation = self._config_generation
+
+        value = await self._query_register(name)
+
+        # do not store values which were read while the register was written
+        if self._cache_configuration and generation == self._config_generation:
+            self._config_cache[name] = value
+
+        return self._copy(value)
+
+    async def _write_configuration(self, name, *datas):
+        try:
+            await self._write(getattr(self._commands, name), *datas)
+        finally:
+            # the device may adjust written values, so read them again next time
+            self._config_generation += 1
+            self._config_cache.pop(name, None)
+
+    def _copy(self, value):
+        if isinstance(value, list):
+            return list(value)
+        return value
+
+    def invalidate_configuration(self):
+        """Drops all cached configuration registers."""
+        self._config_generation += 1
+        self._config_cache.clear()
+
+    async def refresh_configuration(self):
+        """Re-reads all configuration registers."""
+        self.invalidate_configuration()
+
+        for name in self.CONFIGURATION_REGISTERS:
+            await self._query_configuration(name)
+
+    async def get_firmware_configuration(self):
+        return await self._query_configuration('firmware_config')
+
+    async def get_firmware_number(self):
+        return await self._query_configuration('firmware_number')
+
+    async def get_identification(self):
+        return await self._query_configuration('identification')
+
+    async def get_interface_configuration(self):
+        return await self._query_configuration('interface_config')
+
+    # Warning: changing the baud rate requires to reconfigure the transport
+    async def set_interface_configuration(self, configuration):
+        await self._write_configuration('interface_config', configuration)
+
+    async def get_pid_controller(self):
+        return await self._query_configuration('PID_controller')
+
+    async def set_pid_controller(self, configuration):
+        await self._write_configuration('PID_controller', configuration)
+
+    async def get_assembly(self):
+        return await self._query_register('assembly')
+
+    async def get_device_status(self):
+        return await self._query_register('device_status')
+
+    async def get_warnings(self):
+        return await self._query_register('warnings')
+
+    async def get_errors(self):
+        return await self._query(self._commands.errors)
+
+    async def get_error_code(self):
+        """Returns the code of errors (i:50) as sent, e.g. '00000000', see DEVICE_ERROR."""
+        return await self._query(self._commands.error_code)
+
+    async def get_position(self):
+        return int(await self._query(self._commands.position))
+
+    async def get_valve_configuration(self):
+        return await self._query_configuration('valve_configuration')
+
+    # Warning: Read the documents for the valve, in order to send
+    # a correct configuration!
+    # There are no checks for correctness!
+    async def set_valve_configuration(self, configuration):
+        await self._write_configuration('valve_configuration', configuration)
+
+    async def set_position(self, setpoint):
+        await self._write(self._commands.position, VAT590Driver._position_data(self, setpoint))
+
+    async def get_sensor_offset(self):
+        return int(await self._query(self._commands.sensor_offset))
+
+    async def get_sensor_reading(self):
+        return int(await self._query(self._commands.sensor_reading))
+
+    async def get_pressure(self):
+        return int(await self._query(self._commands.pressure))
+
+    async def set_pressure(self, setpoint):
+        await self._write(self._commands.pressure, VAT590Driver._pressure_data(self, setpoint))
+
+    async def hold(self):
+        await self._write(self._commands.hold, '')
+
+    async def reset(self, mode=None):
+        await self._write(self._commands.reset, VAT590Driver._reset_data(self, mode))
+
+    async def close(self):
+        await self._write(self._commands.close, '')
+
+    async def open(self):
+        await self._write(self._commands.open, '')
+
+    async def set_access(self, mode):
+        await self._write(self._commands.access_mode, VAT590Driver._access_data(self, mode))
+
+    async def get_speed(self):
+        return int(await self._query(self._commands.speed))
+
+    async def set_speed(self, speed):
+        await self._write(self._commands.speed, VAT590Driver._speed_data(self, speed))
+
+    async def get_pressure_range(self):
+        return int((await self.get_range_configuration())[1])
+
+    async def get_position_range(self):
+        return int((await self.get_range_configuration())[0])
+
+    async def get_range_configuration(self):
+        return await self._query_configuration('range_config')
+
+    def convert_from_range_configuration(self, range):
+        return VAT590Driver.convert_from_range_configuration(self, range)
+
+    def convert_to_range_configuration(self, range):
+        return VAT590Driver.convert_to_range_configuration(self, range)
+
+    async def set_range_configuration(self, position_range, pressure_range):
+        await self._write_configuration('range_config', VAT590Driver._range_data(self, position_range, pressure_range))
+
+    async def set_pressure_alignment(self, setpoint):
+        await self._write(self._commands.pressure_alignment, VAT590Driver._pressure_data(self, setpoint))
+
+    async def zero(self):
+        await self._write(self._commands.zero, '')
+
+    async def learn(self, setpoint):
+        await self._write(self._commands.learn, VAT590Driver._learn_data(self, setpoint))
+
+    async def get_sensor_configuration(self):
+        return await self._query_configuration('sensor_configuration')
+
+    async def set_sensor_configuration(self, config):
+        await self._write_configuration('sensor_configuration', VAT590Driver._sensor_data(self, config))
@@ -0,0 +1,85 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from e21_util.error import CommunicationError
+
+from vat_590.protocol import VAT590Framing
+
+
+class AsyncVAT590Protocol(VAT590Framing):
+    """
+    asyncio flavour of VAT590Protocol.
+
+    Works on a (StreamReader, StreamWriter) pair, for example as returned by
+    serial_asyncio.open_serial_connection. The lock only serializes round trips
+    on this one port, hence round trips on different ports run concurrently.
+    """
+
+    def __init__(self, reader, writer, logger, timeout=1.0):
+        super(AsyncVAT590Protocol, self).__init__(logger)
+
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+        self.timeout = timeout
+
+    async def read_response(self):
+        try:
+            resp = await asyncio.wait_for(self._reader.readuntil(b"\r\n"), self.timeout)
+        except Exception:
+            raise CommunicationError("Could not read response")
+
+        # remove the last two bytes since they are just \r\n
+        resp = resp[:-2]
+        if self._is_debug():
+            self._logger.debug('Response: "%s"', repr(resp))
+        return resp
+
+    async def send_message(self, raw_data):
+        try:
+            if self._is_debug():
+                self._logger.debug('Sending: "%s"', repr(raw_data))
+            self._writer.write(raw_data)
+            await self._writer.drain()
+        except Exception:
+            raise CommunicationError("Could not send data")
+
+    async def query(self, header, *data):
+        async with self._lock:
+            message = self.create_message(header, *data)
+            await self.send_message(message)
+            response = await self.read_response()
+
+        return self.parse_response(response, header)
+
+    async def write(self, header, *data):
+        async with self._lock:
+            message = self.create_message(header, *data)
+            await self.send_message(message)
+            response = await self.read_response()
+
+        if len(response) > 0:
+            self._logger.error('Received Unexpected response data: "%s"', repr(response))
+
+    async def clear(self):
+        async with self._lock:
+            while True:
+                try:
+                    if not await asyncio.wait_for(self._reader.read(25), self.timeout):
+                        return True
+                except asyncio.TimeoutError:
+                    return True
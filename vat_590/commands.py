@@ -0,0 +1,195 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from slave.driver import Command
+from slave.types import String, Mapping, BitSequence
+
+from vat_590.constants import *
+
+
+class VAT590Commands(object):
+    """
+    The command table of the VAT 590 series.
+
+    Shared by the blocking and the asyncio driver, such that both speak
+    exactly the same commands.
+    """
+
+    def __init__(self):
+        self.PID_controller = Command(
+            'i:02',
+            's:02',
+            String
+        )
+
+        self.interface_config = Command(
+            'i:20',
+            's:20',
+            BitSequence([
+                (1, Mapping(BAUD_RATE)),  # Baud rate
+                (1, Mapping(PARITY_BIT)),  # Parity bit
+                (1, Mapping(DATA_LENGTH)),  # Data length
+                (1, Mapping(STOP_BITS)),  # Number of stop bits
+                (1, Mapping({'Reserved': '0'})),
+                (1, Mapping(DIGITAL_INPUT)),  # Digital input OPEN valve
+                (1, Mapping(DIGITAL_INPUT)),  # Digital input CLOSED valve
+                (1, Mapping({'Reserved': '0'}))
+            ])
+        )
+
+        self.device_status = Command(('i:30', BitSequence([
+            (1, Mapping(OPERATION_MODE)),  # Operation mode
+            (1, Mapping(STATUS)),  # Status
+            (1, Mapping(POWER_FAILURE_BATTERY)),  # Power failure option
+            (1, Mapping(OPERATION))  # Operation
+        ])))
+
+        self.assembly = Command('i:76', 'i:76', BitSequence([
+            (6, String()),  # Position
+            (1, Mapping(PRESSURE_READING)),  # Pressure reading
+            (7, String()),  # Pressure
+            (1, Mapping(OPERATION_MODE)),  # Operation mode
+            (1, Mapping(STATUS)),  # Status
+            (1, Mapping(WARNING))  # Warning
+        ]))
+
+        self.warnings = Command(('i:51', BitSequence([
+            (1, Mapping(SERVICE)),  # Service
+            (1, Mapping(LEARN_DATA)),  # Learn data set
+            (1, Mapping(POWER_FAILURE_BATTERY)),  # Power failure battery
+            (1, Mapping(COMPRESSED_AIR_SUPPLY))  # Compressed air supply
+        ])))
+
+        self.valve_configuration = Command('i:04', 's:04', BitSequence([
+            (1, Mapping(CLOSE_OPEN)),  # VALVE_POWER_UP
+            (1, Mapping(CLOSE_OPEN)),  # VALVE_POWER_FAILURE
+            (1, Mapping(NO_YES)),  # EXTERNAL_ISOLATION_VALVE_FUNCTION
+            (1, Mapping(NO_YES)),  # CONTROL_STROKE_LIMITATION
+            (1, Mapping(VALVE_FAILURE_POSITION)),  # NETWORK_FAILURE_END_POSITION
+            (1, Mapping(VALVE_FAILURE_POSITION)),  # SLAVE_OFFLINE_POSITION
+            (1, Mapping(SYNCHRONIZATION_START)),
+            (1, Mapping(SYNCHRONIZATION_MODE)),
+        ]))
+
+        self.errors = Command(('i:50', Mapping(DEVICE_ERROR)))
+        # the undecoded code of errors, which never fails on unknown codes
+        self.error_code = Command(('i:50', String))
+
+        self.range_config = Command('i:21', 's:21', BitSequence([
+            (1, String()),  # Position range
+            (7, String()),  # Pressure range
+        ]))
+
+        self.sensor_configuration = Command('i:01', 's:01', BitSequence([
+            (1, String()),
+            (1, String()),
+            (6, String())
+        ]))
+
+        self.sensor_reading = Command('i:64', 'i:64', String)
+        self.sensor_offset = Command('i:60', 'i:60', String)
+        self.speed = Command('i:68', 'V:', String)
+        self.pressure = Command('P:', 'S:', String)
+        self.position = Command('A:', 'R:', String)
+        self.identification = Command(('i:83', String))
+        self.firmware_number = Command(('i:84', String))
+        self.firmware_config = Command(('i:82', String))
+        self.pressure_alignment = Command('c:6002', 'c:6002', String)
+        self.zero = Command(write=('Z:', String))
+        self.learn = Command(write=('L:0', String))
+
+        # write only commands
+        self.hold = Command(write=('H:', String))
+        self.reset = Command(write=('c:82', String))
+        self.close = Command(write=('C:', String))
+        self.open = Command(write=('O:', String))
+        self.access_mode = Command(write=('c:01', String))
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_commands():
+    """
+    Returns the command table shared by all drivers which are not given their own.
+
+    The commands are immutable definitions, hence one table built on first
+    use serves every driver instead of one table per driver.
+    """
+    global _default
+
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = VAT590Commands()
+
+    return _default
+
+
+class _Captured(Exception):
+    def __init__(self, header, data):
+        super(_Captured, self).__init__(header)
+        self.header = header
+        self.data = data
+
+
+class _CaptureProtocol(object):
+    # Stands in for a protocol to learn which frame a command would send.
+    def query(self, transport, header, *data):
+        raise _Captured(header, data)
+
+    def write(self, transport, header, *data):
+        raise _Captured(header, data)
+
+
+class _ReplayProtocol(object):
+    # Stands in for a protocol to hand an already received response to a command.
+    def __init__(self, response):
+        self._response = response
+
+    def query(self, transport, header, *data):
+        return self._response
+
+    def write(self, transport, header, *data):
+        return None
+
+
+_capture = _CaptureProtocol()
+
+
+def query_request(cmd, *data):
+    """Returns the (header, data) tuple which is sent when querying cmd."""
+    try:
+        cmd.query(None, _capture, *data)
+    except _Captured as request:
+        return request.header, request.data
+    raise ValueError("Command did not issue a query")
+
+
+def write_request(cmd, *data):
+    """Returns the (header, data) tuple which is sent when writing cmd."""
+    try:
+        cmd.write(None, _capture, *data)
+    except _Captured as request:
+        return request.header, request.data
+    raise ValueError("Command did not issue a write")
+
+
+def decode_response(cmd, response):
+    """Parses the response of VAT590Protocol.parse_response for the query of cmd."""
+    return cmd.query(None, _ReplayProtocol(response))
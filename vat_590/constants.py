@@ -153,6 +153,12 @@ SYNCHRONIZATION_START = {
     'always': '4'
 }
 
+DEVICE_ERROR = {
+    'No errors': '00000000',
+    'Sensor 1 signal converter failure.': '01000000',
+    'Firmware memory failure.': '00010000'
+}
+
 SYNCHRONIZATION_MODE = {
     'short': '0',
     'full': '1'
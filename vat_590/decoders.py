@@ -0,0 +1,167 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import namedtuple
+
+from vat_590.commands import default_commands
+from vat_590.constants import *
+
+Assembly = namedtuple('Assembly', [
+    'position', 'pressure_reading', 'pressure', 'operation_mode', 'status', 'warning'
+])
+
+DeviceStatus = namedtuple('DeviceStatus', [
+    'operation_mode', 'status', 'power_failure_battery', 'operation'
+])
+
+Warnings = namedtuple('Warnings', [
+    'service', 'learn_data', 'power_failure_battery', 'compressed_air_supply'
+])
+
+ValveConfiguration = namedtuple('ValveConfiguration', [
+    'valve_power_up',
+    'valve_power_failure',
+    'external_isolation_valve_function',
+    'control_stroke_limitation',
+    'network_failure_end_position',
+    'slave_offline_position',
+    'synchronization_start',
+    'synchronization_mode'
+])
+
+
+class FixedWidthDecoder(object):
+    """
+    Decodes a response of fixed width fields into a record.
+
+    This decodes the same layouts as the slave BitSequence types of
+    VAT590Commands, but the field offsets and the inverse lookup tables of
+    the constants are computed once, when the decoder is created. Fields are
+    given as (width, table) where table is a mapping of constants.py or
+    None to keep the raw string.
+    """
+
+    def __init__(self, header, record, fields):
+        self.header = header
+        self.record = record
+        self.length = sum(width for width, table in fields)
+        self.fields = fields
+
+        namespace = {'record': record}
+        values = []
+        offset = 0
+        for i, (width, table) in enumerate(fields):
+            if width == 1:
+                field = 'p[%d]' % offset
+            else:
+                field = 'p[%d:%d]' % (offset, offset + width)
+
+            if table is not None:
+                namespace['t%d' % i] = dict((code, name) for name, code in table.items())
+                field = 't%d[%s]' % (i, field)
+
+            values.append(field)
+            offset += width
+
+        source = 'def decode(p):\n    return record(%s)\n' % ', '.join(values)
+        exec(source, namespace)
+        self._decode = namespace['decode']
+
+    def decode_payload(self, payload):
+        if len(payload) != self.length:
+            raise ValueError('Response "%s" to %s has wrong length, expected %d' % (payload, self.header, self.length))
+
+        try:
+            return self._decode(payload)
+        except KeyError as e:
+            raise ValueError('Response "%s" to %s contains unknown value %s' % (payload, self.header, str(e)))
+
+    def encode_payload(self, record):
+        """Returns the payload of a record, the inverse of decode_payload."""
+        codes = []
+        for value, (width, table) in zip(record, self.fields):
+            code = value if table is None else table[value]
+            if len(code) != width:
+                raise ValueError('Value "%s" of %s does not fit %d characters' % (value, self.header, width))
+            codes.append(code)
+
+        return ''.join(codes)
+
+    def decode(self, response):
+        """Decodes a response as returned by VAT590Protocol.parse_response."""
+        if len(response) != 1:
+            raise ValueError('Response to %s is malformed: %s' % (self.header, repr(response)))
+
+        return self.decode_payload(response[0])
+
+    __call__ = decode
+
+
+ASSEMBLY = FixedWidthDecoder('i:76', Assembly, [
+    (6, None),
+    (1, PRESSURE_READING),
+    (7, None),
+    (1, OPERATION_MODE),
+    (1, STATUS),
+    (1, WARNING)
+])
+
+DEVICE_STATUS = FixedWidthDecoder('i:30', DeviceStatus, [
+    (1, OPERATION_MODE),
+    (1, STATUS),
+    (1, POWER_FAILURE_BATTERY),
+    (1, OPERATION)
+])
+
+WARNINGS = FixedWidthDecoder('i:51', Warnings, [
+    (1, SERVICE),
+    (1, LEARN_DATA),
+    (1, POWER_FAILURE_BATTERY),
+    (1, COMPRESSED_AIR_SUPPLY)
+])
+
+VALVE_CONFIGURATION = FixedWidthDecoder('i:04', ValveConfiguration, [
+    (1, CLOSE_OPEN),
+    (1, CLOSE_OPEN),
+    (1, NO_YES),
+    (1, NO_YES),
+    (1, VALVE_FAILURE_POSITION),
+    (1, VALVE_FAILURE_POSITION),
+    (1, SYNCHRONIZATION_START),
+    (1, SYNCHRONIZATION_MODE)
+])
+
+# decoders by the name of their command in VAT590Commands
+DECODERS = {
+    'assembly': ASSEMBLY,
+    'device_status': DEVICE_STATUS,
+    'warnings': WARNINGS,
+    'valve_configuration': VALVE_CONFIGURATION,
+}
+
+
+def decoders_for(commands):
+    """
+    Returns the decoders, by command name, which apply to a table of commands.
+
+    The decoders mirror the commands of the default table, other tables
+    only get the decoders of the commands they share with it.
+    """
+    default = default_commands()
+    if commands is default:
+        return DECODERS
+
+    return dict((name, decoder) for name, decoder in DECODERS.items()
+                if getattr(commands, name, None) is getattr(default, name))
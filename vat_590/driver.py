@@ -13,11 +13,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from slave.driver import Driver, Command
-from slave.types import String, Mapping, BitSequence
+import threading
+
+from slave.driver import Command
 
 from vat_590.protocol import VAT590Protocol
-from vat_590.constants import *
+from vat_590.commands import default_commands, query_request, write_request, decode_response
+from vat_590.decoders import decoders_for
+from vat_590.setpoints import VAT590SetpointWriter
+from vat_590.singleflight import SingleFlight
+from vat_590.trajectory import VAT590TrajectoryStreamer
 
 class VAT590Driver(object):
 
@@ -32,212 +37,502 @@ class VAT590Driver(object):
     RANGE_POSITION_10000 = '1'
     RANGE_POSITION_100000 = '2'
 
-    def __init__(self, transport, protocol):
+    # getters which can be pipelined with query_many, with their
+    # command and the conversion applied on the decoded response
+    BATCH_QUERIES = {
+        'get_firmware_configuration': ('firmware_config', None),
+        'get_firmware_number': ('firmware_number', None),
+        'get_identification': ('identification', None),
+        'get_assembly': ('assembly', None),
+        'get_device_status': ('device_status', None),
+        'get_warnings': ('warnings', None),
+        'get_errors': ('errors', None),
+        'get_error_code': ('error_code', None),
+        'get_position': ('position', int),
+        'get_valve_configuration': ('valve_configuration', None),
+        'get_sensor_offset': ('sensor_offset', int),
+        'get_sensor_reading': ('sensor_reading', int),
+        'get_pressure': ('pressure', int),
+        'get_speed': ('speed', int),
+        'get_range_configuration': ('range_config', None),
+        'get_sensor_configuration': ('sensor_configuration', None),
+        'get_interface_configuration': ('interface_config', None),
+        'get_pid_controller': ('PID_controller', None),
+    }
+
+    # registers which only change when written, these are cached by the driver
+    CONFIGURATION_REGISTERS = (
+        'identification',
+        'firmware_number',
+        'firmware_config',
+        'valve_configuration',
+        'sensor_configuration',
+        'interface_config',
+        'range_config',
+        'PID_controller',
+    )
+
+    def __init__(self, transport, protocol, commands=None, cache_configuration=True, coalesce_reads=True):
         assert isinstance(protocol, VAT590Protocol)
 
         self._transport = transport
         self._protocol = protocol
 
-        self.PID_controller = Command(
-            'i:02',
-            's:02',
-            String
-        )
-
-        self.interface_config = Command(
-            'i:20',
-            's:20',
-            BitSequence([
-                (1, Mapping(BAUD_RATE)),  # Baud rate
-                (1, Mapping(PARITY_BIT)),  # Parity bit
-                (1, Mapping(DATA_LENGTH)),  # Data length
-                (1, Mapping(STOP_BITS)),  # Number of stop bits
-                (1, Mapping({'Reserved': '0'})),
-                (1, Mapping(DIGITAL_INPUT)),  # Digital input OPEN valve
-                (1, Mapping(DIGITAL_INPUT)),  # Digital input CLOSED valve
-                (1, Mapping({'Reserved': '0'}))
-            ])
-        )
-
-        self._device_status = Command(('i:30', BitSequence([
-            (1, Mapping(OPERATION_MODE)),  # Operation mode
-            (1, Mapping(STATUS)),  # Status
-            (1, Mapping(POWER_FAILURE_BATTERY)),  # Power failure option
-            (1, Mapping(OPERATION))  # Operation
-        ])))
-
-        self._assembly = Command('i:76', 'i:76', BitSequence([
-            (6, String()),  # Position
-            (1, Mapping(PRESSURE_READING)),  # Pressure reading
-            (7, String()),  # Pressure
-            (1, Mapping(OPERATION_MODE)),  # Operation mode
-            (1, Mapping(STATUS)),  # Status
-            (1, Mapping(WARNING))  # Warning
-        ]))
-
-        self._warnings = Command(('i:51', BitSequence([
-            (1, Mapping(SERVICE)),  # Service
-            (1, Mapping(LEARN_DATA)),  # Learn data set
-            (1, Mapping(POWER_FAILURE_BATTERY)),  # Power failure battery
-            (1, Mapping(COMPRESSED_AIR_SUPPLY))  # Compressed air supply
-        ])))
-
-        self._valve_configuration = Command('i:04', 's:04', BitSequence([
-            (1, Mapping(CLOSE_OPEN)),  # VALVE_POWER_UP
-            (1, Mapping(CLOSE_OPEN)),  # VALVE_POWER_FAILURE
-            (1, Mapping(NO_YES)),  # EXTERNAL_ISOLATION_VALVE_FUNCTION
-            (1, Mapping(NO_YES)),  # CONTROL_STROKE_LIMITATION
-            (1, Mapping(VALVE_FAILURE_POSITION)),  # NETWORK_FAILURE_END_POSITION
-            (1, Mapping(VALVE_FAILURE_POSITION)),  # SLAVE_OFFLINE_POSITION
-            (1, Mapping(SYNCHRONIZATION_START)),
-            (1, Mapping(SYNCHRONIZATION_MODE)),
-        ]))
-
-        self._errors = Command(('i:50', Mapping({
-            'No errors': '00000000',
-            'Sensor 1 signal converter failure.': '01000000',
-            'Firmware memory failure.': '00010000'
-        })))
-
-        self._range_config = Command('i:21', 's:21', BitSequence([
-            (1, String()),  # Position range
-            (7, String()),  # Pressure range
-        ]))
-
-        self._sensor_configuration = Command('i:01', 's:01', BitSequence([
-            (1, String()),
-            (1, String()),
-            (6, String())    
-        ]))
-
-        self._sensor_reading = Command('i:64', 'i:64', String)
-        self._sensor_offset = Command('i:60', 'i:60', String)
-        self._speed = Command('i:68', 'V:', String)
-        self._pressure = Command('P:', 'S:', String)
-        self._position = Command('A:', 'R:', String)
-        self._identification = Command(('i:83', String))
-        self._firmware_number = Command(('i:84', String))
-        self._firmware_config = Command(('i:82', String))
-        self._pressure_alignment = Command('c:6002', 'c:6002', String)
-        self._zero = ('Z:', String)
-        self._learn = ('L:0', String)
-
-        # write only commands
-        self._hold = ('H:', String)
-        self._reset = ('c:82', String)
-        self._close = ('C:', String)
-        self._open = ('O:', String)
-        self._access_mode = ('c:01', String)
+        if commands is None:
+            commands = default_commands()
+
+        self._commands = commands
+        # precompiled decoders of the registers, by command name
+        self._decoders = decoders_for(commands)
+
+        self.PID_controller = commands.PID_controller
+        self.interface_config = commands.interface_config
+
+        self._cache_configuration = cache_configuration
+        self._config_cache = {}
+        self._config_generation = 0
+        self._config_lock = threading.Lock()
+
+        # concurrent identical reads share one round trip
+        self._reads = SingleFlight() if coalesce_reads else None
+
+        self._setpoints = None
+        self._trajectory = None
+        self._trajectory_lock = threading.Lock()
 
     def clear(self):
         self._protocol.clear()
 
+    def enable_statistics(self):
+        """Starts recording latencies, byte counts and E: responses, see ProtocolStatistics."""
+        self._protocol.enable_statistics()
+
+    def disable_statistics(self):
+        self._protocol.disable_statistics()
+
+    def enable_resync(self, retries=3, backoff=0.005, max_backoff=0.1, max_skipped=4):
+        """Recovers from garbled or stale frames by resynchronizing, see VAT590Protocol.enable_resync."""
+        self._protocol.enable_resync(retries, backoff, max_backoff, max_skipped)
+
+    def disable_resync(self):
+        self._protocol.disable_resync()
+
+    def enable_trace(self, size=4096, directory=None, min_interval=10.0):
+        """Records the last frames and dumps them into directory on errors, see VAT590Protocol.enable_trace."""
+        self._protocol.enable_trace(size, directory, min_interval)
+
+    def disable_trace(self):
+        self._protocol.disable_trace()
+
+    def dump_trace(self, path):
+        """Writes the recorded frames to path, returns their number or None if the trace is disabled."""
+        trace = self._protocol.trace
+        if trace is None:
+            return None
+
+        return trace.dump(path, 'Requested')
+
+    def reset_statistics(self):
+        if self._protocol.statistics is not None:
+            self._protocol.statistics.reset()
+
+    def get_statistics(self):
+        """Returns a snapshot of the protocol statistics, or None if they are disabled."""
+        statistics = self._protocol.statistics
+        if statistics is None:
+            return None
+
+        return statistics.snapshot()
+
     def _query(self, cmd):
         if not isinstance(cmd, Command):
             raise TypeError("Can only query on Command")
 
+        if self._reads is None:
+            return self._query_command(cmd)
+
+        return self._reads.do(cmd, self._query_command, cmd)
+
+    def _query_command(self, cmd):
         # TODO: remove self._transport from the call
         return cmd.query(self._transport, self._protocol)
 
+    def _query_register(self, name):
+        # registers with a precompiled decoder skip the slave type machinery
+        decoder = self._decoders.get(name)
+        if decoder is None:
+            return self._query(getattr(self._commands, name))
+
+        if self._reads is None:
+            return self._query_decoder(decoder)
+
+        return self._reads.do(decoder.header, self._query_decoder, decoder)
+
+    def _query_decoder(self, decoder):
+        return decoder.decode(self._protocol.query(self._transport, decoder.header))
+
+    def _decode_register(self, name, response):
+        decoder = self._decoders.get(name)
+        if decoder is None:
+            return decode_response(getattr(self._commands, name), response)
+
+        return decoder.decode(response)
+
+    def query_many(self, queries, raise_errors=True):
+        """
+        Runs several getters in one pipelined round trip.
+
+        queries is a list of getter names, see BATCH_QUERIES, e.g.
+        ['get_pressure', 'get_position', 'get_device_status'].
+        Returns the results in the same order. All responses are read before
+        an error is raised, such that the following commands stay in sync.
+        With raise_errors=False the failing entries contain the exception
+        instead, also if a response could not be decoded.
+        """
+        commands = []
+        for query in queries:
+            if query not in self.BATCH_QUERIES:
+                raise ValueError("Can not pipeline %s, see BATCH_QUERIES" % str(query))
+
+            name, convert = self.BATCH_QUERIES[query]
+            commands.append((name, convert))
+
+        requests = [query_request(getattr(self._commands, name)) for name, convert in commands]
+        responses = self._protocol.query_many(self._transport, requests)
+
+        results = []
+        for (name, convert), response in zip(commands, responses):
+            if isinstance(response, Exception):
+                if raise_errors:
+                    raise response
+                results.append(response)
+                continue
+
+            try:
+                value = self._decode_register(name, response)
+                if convert is not None:
+                    value = convert(value)
+            except Exception as e:
+                if raise_errors:
+                    raise
+                value = e
+            results.append(value)
+
+        return results
+
     def _write(self, cmd, *datas):
+        return self._write_ordered(self._write_command, cmd, *datas)
+
+    def _write_checked(self, name, *datas):
+        # like _write, but raises an ErrorResponse if the device rejected the command
+        return self._write_ordered(self._write_acknowledged, getattr(self._commands, name), *datas)
+
+    def _write_ordered(self, write, cmd, *datas):
+        setpoints = self._setpoints
+        if setpoints is None:
+            return write(cmd, *datas)
+
+        # keep the order of queued setpoints and other writes. The error of a
+        # failed setpoint is left to flush_setpoints, it must not block e.g. close()
+        setpoints.write_pending()
+        try:
+            return write(cmd, *datas)
+        finally:
+            setpoints.invalidate()
+
+    def _write_command(self, cmd, *datas):
         if not isinstance(cmd, Command):
             cmd = Command(write=cmd)
 
         # TODO: remove self._transport from the call
         cmd.write(self._transport, self._protocol, *datas)
 
+    def _write_acknowledged(self, cmd, *datas):
+        # raises an ErrorResponse if the device rejected the command
+        header, data = write_request(cmd, *datas)
+        self._protocol.write_acknowledged(self._transport, header, *data)
+
+    def _write_setpoint(self, name, setpoint, data):
+        setpoints = self._setpoints
+        if setpoints is None:
+            self._write_command(getattr(self._commands, name), data)
+        else:
+            setpoints.submit(name, setpoint, data)
+
+    def _send_setpoint(self, name, data):
+        # a setpoint rejected by the device, e.g. in local operation, is not acknowledged
+        self._write_acknowledged(getattr(self._commands, name), data)
+
+    def enable_write_behind(self, max_rate=50.0):
+        """
+        Queues set_position and set_pressure instead of writing them immediately.
+
+        Setpoints equal to the last acknowledged one are dropped, and at most
+        max_rate setpoints per second are written, the newest one wins. Errors
+        of queued writes are raised by the next flush_setpoints.
+        """
+        if self._setpoints is not None:
+            self.disable_write_behind()
+
+        self._setpoints = VAT590SetpointWriter(self._send_setpoint, max_rate)
+
+    def disable_write_behind(self):
+        """Writes the pending setpoint and returns to immediate writes."""
+        setpoints = self._setpoints
+        if setpoints is None:
+            return
+
+        self._setpoints = None
+        setpoints.close()
+
+    def flush_setpoints(self):
+        """Writes the pending setpoint now and raises the error of a failed queued write."""
+        if self._setpoints is not None:
+            self._setpoints.flush()
+
+    def get_acknowledged_setpoint(self):
+        """
+        Returns ('position', setpoint) or ('pressure', setpoint) of the last
+        queued setpoint the device acknowledged, or None.
+        """
+        if self._setpoints is None:
+            return None
+
+        return self._setpoints.get_acknowledged()
+
+    def get_pending_setpoint(self):
+        """Returns (name, setpoint) of the queued setpoint which is not yet written, or None."""
+        if self._setpoints is None:
+            return None
+
+        return self._setpoints.get_pending()
+
+    def run_trajectory(self, profile, mode='pressure', reads=None, read_interval=0.0, delay=0.0):
+        """
+        Streams a profile of pressure (S:) or position (R:) setpoints and returns a TrajectoryReport.
+
+        profile is a list of (time, setpoint), e.g. from trajectory.ramp.
+        Points are written on absolute deadlines and stale points are
+        skipped, see VAT590TrajectoryStreamer. reads is a list of getters, see
+        query_many, read in one round trip between the writes. Blocks until
+        the last point, stop_trajectory ends it from another thread. Only
+        one trajectory runs at a time, a second one raises a RuntimeError.
+        """
+        if mode == 'pressure':
+            encode = self._pressure_data
+        elif mode == 'position':
+            encode = self._position_data
+        else:
+            raise ValueError("mode must be 'pressure' or 'position', given: %s" % str(mode))
+
+        # fail before the first write
+        for point in profile:
+            encode(point[1])
+
+        read = None
+        if reads:
+            for query in reads:
+                if query not in self.BATCH_QUERIES:
+                    raise ValueError("Can not pipeline %s, see BATCH_QUERIES" % str(query))
+            read = lambda: self.query_many(reads, raise_errors=False)
+
+        command = getattr(self._commands, mode)
+        streamer = VAT590TrajectoryStreamer(lambda setpoint: self._write(command, encode(setpoint)), read,
+                                            read_interval)
+
+        with self._trajectory_lock:
+            if self._trajectory is not None:
+                raise RuntimeError("A trajectory is already running")
+            self._trajectory = streamer
+
+        try:
+            return streamer.run(profile, delay)
+        finally:
+            with self._trajectory_lock:
+                self._trajectory = None
+
+    def stop_trajectory(self):
+        with self._trajectory_lock:
+            streamer = self._trajectory
+        if streamer is not None:
+            streamer.stop()
+
+    def _query_configuration(self, name):
+        with self._config_lock:
+            if name in self._config_cache:
+                return self._copy(self._config_cache[name])
+            generation = self._config_generation
+
+        value = self._query_register(name)
+
+        with self._config_lock:
+            # do not store values which were read while the register was written
+            if self._cache_configuration and generation == self._config_generation:
+                self._config_cache[name] = value
+
+        return self._copy(value)
+
+    def _write_configuration(self, name, *datas):
+        try:
+            self._write(getattr(self._commands, name), *datas)
+        finally:
+            # the device may adjust written values, so read them again next time
+            with self._config_lock:
+                self._config_generation += 1
+                self._config_cache.pop(name, None)
+
+    def _copy(self, value):
+        if isinstance(value, list):
+            return list(value)
+        return value
+
+    def invalidate_configuration(self):
+        """Drops all cached configuration registers."""
+        with self._config_lock:
+            self._config_generation += 1
+            self._config_cache.clear()
+
+    def refresh_configuration(self):
+        """Re-reads all configuration registers in one pipelined round trip."""
+        self.invalidate_configuration()
+
+        getters = [getter for getter, (name, convert) in self.BATCH_QUERIES.items()
+                   if name in self.CONFIGURATION_REGISTERS]
+
+        with self._config_lock:
+            generation = self._config_generation
+
+        values = self.query_many(getters)
+
+        with self._config_lock:
+            if self._cache_configuration and generation == self._config_generation:
+                for getter, value in zip(getters, values):
+                    self._config_cache[self.BATCH_QUERIES[getter][0]] = value
+
     def get_firmware_configuration(self):
-        return self._query(self._firmware_config)
+        return self._query_configuration('firmware_config')
 
     def get_firmware_number(self):
-        self._query(self._firmware_number)
+        return self._query_configuration('firmware_number')
 
     def get_identification(self):
-        return self._query(self._identification)
+        return self._query_configuration('identification')
+
+    def get_interface_configuration(self):
+        return self._query_configuration('interface_config')
+
+    # Warning: changing the baud rate requires to reconfigure the transport
+    def set_interface_configuration(self, configuration):
+        self._write_configuration('interface_config', configuration)
+
+    def get_pid_controller(self):
+        return self._query_configuration('PID_controller')
+
+    def set_pid_controller(self, configuration):
+        self._write_configuration('PID_controller', configuration)
 
     def get_assembly(self):
-        return self._query(self._assembly)
+        return self._query_register('assembly')
 
     def get_device_status(self):
-        return self._query(self._device_status)
+        return self._query_register('device_status')
 
     def get_warnings(self):
-        return self._query(self._warnings)
+        return self._query_register('warnings')
 
     def get_errors(self):
-        return self._query(self._errors)
+        return self._query(self._commands.errors)
+
+    def get_error_code(self):
+        """Returns the code of errors (i:50) as sent, e.g. '00000000', see DEVICE_ERROR."""
+        return self._query(self._commands.error_code)
 
     def get_position(self):
-        return int(self._query(self._position))
+        return int(self._query(self._commands.position))
 
     def get_valve_configuration(self):
-        return self._query(self._valve_configuration)
+        return self._query_configuration('valve_configuration')
 
     # Warning: Read the documents for the valve, in order to send
     # a correct configuration!
     # There are no checks for correctness!
     def set_valve_configuration(self, configuration):
-        self._write(self._valve_configiguration, configuration)
+        self._write_configuration('valve_configuration', configuration)
 
     def set_position(self, setpoint):
-        if not isinstance(setpoint, (int, long)):
+        self._write_setpoint('position', setpoint, self._position_data(setpoint))
+
+    def _position_data(self, setpoint):
+        if not isinstance(setpoint, int):
             raise TypeError("setpoint must be an integer")
 
         if setpoint < 0 or setpoint > 1000000:
             raise ValueError("setpoint must be in range (0, 1'000'000)")
 
-        self._write(self._position, str(setpoint).zfill(6))
+        return str(setpoint).zfill(6)
 
     def get_sensor_offset(self):
-        return int(self._query(self._sensor_offset))
+        return int(self._query(self._commands.sensor_offset))
 
     def get_sensor_reading(self):
-        return int(self._query(self._sensor_reading))
+        return int(self._query(self._commands.sensor_reading))
 
     def get_pressure(self):
-        return int(self._query(self._pressure))
+        return int(self._query(self._commands.pressure))
 
     def set_pressure(self, setpoint):
-        if not isinstance(setpoint, (int, long)):
+        self._write_setpoint('pressure', setpoint, self._pressure_data(setpoint))
+
+    def _pressure_data(self, setpoint):
+        if not isinstance(setpoint, int):
             raise TypeError("setpoint must be an integer")
 
         if setpoint < 0 or setpoint > 100000000:
             raise ValueError("setpoint must be in (0, 100'000'000), given: %s" % str(setpoint))
 
-        self._write(self._pressure, str(setpoint).zfill(8))
+        return str(setpoint).zfill(8)
 
     def hold(self):
-        self._write(self._hold, '')
+        self._write(self._commands.hold, '')
 
     def reset(self, mode=None):
+        return self._write(self._commands.reset, self._reset_data(mode))
+
+    def _reset_data(self, mode):
         if mode is None:
             mode = self.RESET_FATAL_ERROR
 
         if mode not in [self.RESET_FATAL_ERROR, self.RESET_WARNINGS]:
             raise ValueError("Wrong reset mode, see RESET_* constants")
 
-        return self._write(self._reset, mode)
+        return mode
 
     def close(self):
-        self._write(self._close, '')
+        self._write(self._commands.close, '')
 
     def open(self):
-        self._write(self._open, '')
+        self._write(self._commands.open, '')
 
     def set_access(self, mode):
+        self._write(self._commands.access_mode, self._access_data(mode))
+
+    def _access_data(self, mode):
         if mode not in [self.ACCESS_MODE_LOCAL, self.ACCESS_MODE_LOCKED_REMOTE, self.ACCESS_MODE_REMOTE]:
             raise ValueError("Wrong access mode, see ACCESS_MODE_* constants")
 
-        self._write(self._access_mode, mode)
+        return mode
 
     def get_speed(self):
-        return int(self._query(self._speed))
+        return int(self._query(self._commands.speed))
 
     def set_speed(self, speed):
-        if not isinstance(speed, (int, long)) or speed >= 10000:
+        self._write(self._commands.speed, self._speed_data(speed))
+
+    def _speed_data(self, speed):
+        if not isinstance(speed, int) or speed >= 10000:
             raise ValueError("Input value too precise or more than 4 digits used")
 
-        self._write(self._speed, str(speed).zfill(6))
+        return str(speed).zfill(6)
 
     def get_pressure_range(self):
         return int(self.get_range_configuration()[1])
@@ -246,69 +541,73 @@ class VAT590Driver(object):
         return int(self.get_range_configuration()[0])
 
     def get_range_configuration(self):
-        return self._query(self._range_config)
+        return self._query_configuration('range_config')
 
     def convert_from_range_configuration(self, range):
-        if range is self.RANGE_POSITION_1000:
+        if range == self.RANGE_POSITION_1000:
             return 1000
-        elif range is self.RANGE_POSITION_10000:
+        elif range == self.RANGE_POSITION_10000:
             return 10000
-        elif range is self.RANGE_POSITION_100000:
+        elif range == self.RANGE_POSITION_100000:
             return 100000
         else:
             raise ValueError("given range is not supported")
 
     def convert_to_range_configuration(self, range):
-        if range is 1000:
+        if range == 1000:
             return self.RANGE_POSITION_1000
-        elif range is 10000:
+        elif range == 10000:
             return self.RANGE_POSITION_10000
-        elif range is 100000:
+        elif range == 100000:
             return self.RANGE_POSITION_100000
         else:
             raise ValueError("given range is not supported")
 
     def set_range_configuration(self, position_range, pressure_range):
+        self._write_configuration('range_config', self._range_data(position_range, pressure_range))
+
+    def _range_data(self, position_range, pressure_range):
         if not position_range in [self.RANGE_POSITION_1000, self.RANGE_POSITION_10000, self.RANGE_POSITION_100000]:
             raise ValueError("position range not valid, see RANGE_POSITION_* constants")
 
-        if not isinstance(pressure_range, (int, long)):
+        if not isinstance(pressure_range, int):
             raise TypeError("pressure range must be an integer")
 
         if pressure_range < 1000 or pressure_range > 1000000:
             raise ValueError("pressure range out of range: [1000, 100'000]")
 
-        self._write(self._range_config, "".join([position_range, str(pressure_range).zfill(7)]))
+        return "".join([position_range, str(pressure_range).zfill(7)])
 
     def set_pressure_alignment(self, setpoint):
-        if not isinstance(setpoint, (int, long)):
-            raise TypeError("setpoint must be an integer")
-
-        if setpoint < 0 or setpoint > 100000000:
-            raise ValueError("setpoint must be in (0, 100'000'000), given: %s" % str(setpoint))
-
-        self._write(self._pressure_alignment, str(setpoint).zfill(8))
+        self._write(self._commands.pressure_alignment, self._pressure_data(setpoint))
 
     def zero(self):
-        self._write(self._zero, '')	
+        self._write(self._commands.zero, '')	
 
     def learn(self, setpoint):
-        if not isinstance(setpoint, (int, long)):
+        self._write(self._commands.learn, self._learn_data(setpoint))
+
+    def _learn_data(self, setpoint):
+        if not isinstance(setpoint, int):
             raise TypeError("setpoint must be an integer")
 
         if setpoint < 0 or setpoint > 100000000:
             raise ValueError("setpoint must be in range (0, 100'000'000), given: %s" % str(setpoint))
 
-        self._write(self._learn, str(setpoint).zfill(8))
+        return str(setpoint).zfill(8)
         
     def get_sensor_configuration(self):
-        return self._query(self._sensor_configuration)
+        return self._query_configuration('sensor_configuration')
 
     def set_sensor_configuration(self, config):
-        if not len(config) == 3:
-            raise ValueError("config must be of format like `get_sensor_configuration`")
         # this creates an error in log file (Unexpected response 's:01') this error can be discarded
         # Notice that the slave lib expects no response when 'setting' values
         # But the VAT590 returns after a set-operation an response.
-        self._write(self._sensor_configuration, "".join(config))
+        self._write_configuration('sensor_configuration', self._sensor_data(config))
+
+    def _sensor_data(self, config):
+        if not len(config) == 3:
+            raise ValueError("config must be of format like `get_sensor_configuration`")
+
+        return "".join(config)
 	
@@ -0,0 +1,484 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# A simulated VAT 590 for testing without hardware. VAT590Emulator models the
+# valve, VAT590EmulatorTransport lets a VAT590Protocol talk to it in-process
+# and VAT590PtyEmulator exposes it on a pseudo terminal.
+#
+#   transport = VAT590EmulatorTransport(VAT590Emulator(), baud_rate=9600)
+#   driver = VAT590Factory.create(transport, logger)
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from e21_util.serial_connection import AbstractTransport, SerialTimeoutException
+
+from vat_590.constants import BAUD_RATE, ERROR_INDEX
+from vat_590.line import baud_rate
+
+STATUS_POSITION_CONTROL = '2'
+STATUS_CLOSED = '3'
+STATUS_OPENED = '4'
+STATUS_PRESSURE_CONTROL = '5'
+STATUS_HOLD = '6'
+STATUS_LEARN = '7'
+
+POSITION_RANGES = {'0': 1000, '1': 10000, '2': 100000}
+
+# baud rate in bit/s by the code of BAUD_RATE
+BAUD_RATES = dict((code, baud_rate(name)) for name, code in BAUD_RATE.items())
+
+ERROR_UNKNOWN_COMMAND = 'E:000020'
+ERROR_INVALID_LENGTH = 'E:000012'
+ERROR_INVALID_VALUE = 'E:000022'
+ERROR_OUT_OF_RANGE = ERROR_INDEX['Value out of range'].rstrip(':')
+ERROR_LOCAL_OPERATION = ERROR_INDEX['Command not accepted due to local operation'].rstrip(':')
+
+
+def _first_order(value, target, dt, tau):
+    if tau <= 0:
+        return target
+    return target + (value - target) * math.exp(-dt / tau)
+
+
+class VAT590Emulator(object):
+    """
+    Model of a VAT 590 valve answering frames of the ASCII protocol.
+
+    Position follows its target and pressure follows the equilibrium pressure
+    of the current position, both as first order lags. The equilibrium
+    pressure falls linearly from the full pressure range at closed valve to
+    zero at open valve. In pressure control the position target is chosen
+    such that the equilibrium pressure equals the setpoint.
+    """
+
+    def __init__(self, position_tau=0.5, pressure_tau=1.0, learn_duration=5.0, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._updated = clock()
+
+        self.position_tau = position_tau
+        self.pressure_tau = pressure_tau
+        self.learn_duration = learn_duration
+
+        self.range_configuration = '2' + '0100000'
+        self.sensor_configuration = '11000000'
+        self.valve_configuration = '00000000'
+        self.interface_configuration = '44100000'
+        self.pid_controller = '000000'
+        self.identification = 'VAT590-EMULATOR'
+        self.firmware_number = '590.0'
+        self.firmware_configuration = '1213'
+        self.access_mode = '01'
+        self.speed = 1000
+        self.sensor_offset = 0
+        self.warnings = '0000'
+        self.errors = '00000000'
+
+        self.status = STATUS_CLOSED
+        self.position = 0.0
+        self.pressure = float(self.pressure_range)
+        self._target_position = 0.0
+        self._setpoint = None
+        self._learn_until = None
+        self._injected = deque()
+
+    @property
+    def position_range(self):
+        return POSITION_RANGES[self.range_configuration[0]]
+
+    @property
+    def pressure_range(self):
+        return int(self.range_configuration[1:])
+
+    @property
+    def baud_rate(self):
+        return BAUD_RATES[self.interface_configuration[0]]
+
+    def equilibrium_pressure(self, position):
+        return self.pressure_range * (1.0 - float(position) / self.position_range)
+
+    def inject(self, response):
+        """Replaces the next response by the given raw bytes, e.g. b'E:000002\\r\\n' or garbage."""
+        with self._lock:
+            self._injected.append(response)
+
+    def _update(self):
+        now = self._clock()
+        dt = now - self._updated
+        self._updated = now
+
+        if self._learn_until is not None and now >= self._learn_until:
+            self._learn_until = None
+            self.status = STATUS_POSITION_CONTROL
+            self._target_position = self.position
+
+        if self.status == STATUS_PRESSURE_CONTROL:
+            setpoint = min(self._setpoint, self.pressure_range)
+            self._target_position = self.position_range * (1.0 - float(setpoint) / self.pressure_range)
+
+        self.position = _first_order(self.position, self._target_position, dt, self.position_tau)
+        self.pressure = _first_order(self.pressure, self.equilibrium_pressure(self.position), dt, self.pressure_tau)
+
+    def handle(self, frame):
+        """Returns the raw response (with CRLF) to the raw frame (with CRLF)."""
+        with self._lock:
+            if self._injected:
+                return self._injected.popleft()
+
+            if not frame.endswith(b'\r\n'):
+                return ('E:000010' + '\r\n').encode('ascii')
+
+            self._update()
+            try:
+                response = self._dispatch(frame[:-2].decode('ascii'))
+            except ValueError:
+                response = ERROR_INVALID_VALUE
+
+            return (response + '\r\n').encode('ascii')
+
+    def _remote(self):
+        return self.access_mode != '00'
+
+    def _move(self, status, target=None, setpoint=None):
+        if not self._remote():
+            return False
+
+        self.status = status
+        self._learn_until = None
+        if target is not None:
+            self._target_position = float(target)
+        self._setpoint = setpoint
+        return True
+
+    def _dispatch(self, frame):
+        if frame[:1] in ('i', 's', 'c'):
+            key = frame[:6] if frame.startswith('c:6002') else frame[:4]
+        else:
+            key = frame[:2]
+        data = frame[len(key):]
+
+        if key in self._queries:
+            if data:
+                return ERROR_INVALID_LENGTH
+            return key + self._queries[key](self)
+
+        if key not in self._writes:
+            return ERROR_UNKNOWN_COMMAND
+
+        length, write = self._writes[key]
+        if length is not None and len(data) != length:
+            return ERROR_INVALID_LENGTH
+
+        error = write(self, data)
+        return error if error else key
+
+    def _assembly(self):
+        sign = '-' if self.pressure < 0 else '0'
+        return '%06d%s%07d%s%s%s' % (round(self.position), sign, abs(round(self.pressure)),
+                                   self.access_mode[1], self.status, '0' if self.warnings == '0000' else '1')
+
+    def _device_status(self):
+        return self.access_mode[1] + self.status + '00'
+
+    def _set_position(self, data):
+        setpoint = int(data)
+        if setpoint > self.position_range:
+            return ERROR_OUT_OF_RANGE
+        if not self._move(STATUS_POSITION_CONTROL, target=setpoint):
+            return ERROR_LOCAL_OPERATION
+
+    def _set_pressure(self, data):
+        setpoint = int(data)
+        if setpoint > self.pressure_range:
+            return ERROR_OUT_OF_RANGE
+        if not self._move(STATUS_PRESSURE_CONTROL, setpoint=setpoint):
+            return ERROR_LOCAL_OPERATION
+
+    def _close(self, data):
+        if not self._move(STATUS_CLOSED, target=0):
+            return ERROR_LOCAL_OPERATION
+
+    def _open(self, data):
+        if not self._move(STATUS_OPENED, target=self.position_range):
+            return ERROR_LOCAL_OPERATION
+
+    def _hold(self, data):
+        if not self._move(STATUS_HOLD, target=self.position):
+            return ERROR_LOCAL_OPERATION
+
+    def _learn(self, data):
+        int(data)
+        if not self._move(STATUS_LEARN, target=self.position):
+            return ERROR_LOCAL_OPERATION
+        self._learn_until = self._clock() + self.learn_duration
+
+    def _zero(self, data):
+        self.sensor_offset = int(round(self.pressure))
+
+    def _reset(self, data):
+        if data == '00':
+            self.warnings = '0000'
+        elif data == '01':
+            self.errors = '00000000'
+        else:
+            return ERROR_INVALID_VALUE
+
+    def _set_access_mode(self, data):
+        if data not in ('00', '01', '02'):
+            return ERROR_INVALID_VALUE
+        self.access_mode = data
+
+    def _set_range_configuration(self, data):
+        if data[0] not in POSITION_RANGES:
+            return ERROR_INVALID_VALUE
+        int(data[1:])
+        self.range_configuration = data
+
+    def _set_interface_configuration(self, data):
+        if data[0] not in BAUD_RATES:
+            return ERROR_INVALID_VALUE
+        self.interface_configuration = data
+
+    def _set_pressure_alignment(self, data):
+        int(data)
+
+    def _set_speed(self, data):
+        self.speed = int(data)
+
+    def _set_register(name):
+        def write(self, data):
+            setattr(self, name, data)
+        return write
+
+    _queries = {
+        'P:': lambda self: '%08d' % max(0, round(self.pressure)),
+        'A:': lambda self: '%06d' % round(self.position),
+        'i:76': _assembly,
+        'i:30': _device_status,
+        'i:51': lambda self: self.warnings,
+        'i:50': lambda self: self.errors,
+        'i:21': lambda self: self.range_configuration,
+        'i:01': lambda self: self.sensor_configuration,
+        'i:02': lambda self: self.pid_controller,
+        'i:04': lambda self: self.valve_configuration,
+        'i:20': lambda self: self.interface_configuration,
+        'i:60': lambda self: '%07d' % self.sensor_offset,
+        'i:64': lambda self: '%07d' % max(0, round(self.pressure)),
+        'i:68': lambda self: '%06d' % self.speed,
+        'i:82': lambda self: self.firmware_configuration,
+        'i:83': lambda self: self.identification,
+        'i:84': lambda self: self.firmware_number,
+    }
+
+    # writes by header, with the expected length of their data
+    _writes = {
+        'R:': (6, _set_position),
+        'S:': (8, _set_pressure),
+        'C:': (0, _close),
+        'O:': (0, _open),
+        'H:': (0, _hold),
+        'L:': (9, _learn),
+        'Z:': (0, _zero),
+        'V:': (6, _set_speed),
+        'c:82': (2, _reset),
+        'c:01': (2, _set_access_mode),
+        'c:6002': (8, _set_pressure_alignment),
+        's:21': (8, _set_range_configuration),
+        's:20': (8, _set_interface_configuration),
+        's:01': (8, _set_register('sensor_configuration')),
+        's:02': (None, _set_register('pid_controller')),
+        's:04': (8, _set_register('valve_configuration')),
+    }
+
+    del _set_register
+
+
+class VAT590EmulatorTransport(AbstractTransport):
+    """
+    Transport connected to a VAT590Emulator instead of a serial port.
+
+    With realtime=True, reads are delayed by the transfer time of request and
+    response at the baud rate of the emulated interface configuration (or the
+    given baud_rate), plus the response latency of the device.
+
+    A given baud_rate is also set on the emulated device. Frames sent while
+    baud_rate differs from the rate of the device, e.g. after s:20, are lost.
+    """
+
+    def __init__(self, emulator=None, baud_rate=None, latency=0.0, realtime=True, timeout=1.0, bits_per_byte=10):
+        super(VAT590EmulatorTransport, self).__init__()
+
+        self.emulator = emulator if emulator is not None else VAT590Emulator()
+        self.baud_rate = baud_rate
+        self.latency = latency
+
+        if baud_rate is not None:
+            codes = [code for code, rate in BAUD_RATES.items() if rate == baud_rate]
+            if not codes:
+                raise ValueError("The device does not support %s baud, see BAUD_RATE" % str(baud_rate))
+
+            configuration = self.emulator.interface_configuration
+            self.emulator.interface_configuration = codes[0] + configuration[1:]
+
+        self.realtime = realtime
+        self.timeout = timeout
+        self.bits_per_byte = bits_per_byte
+
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._sent = 0
+
+    def byte_time(self):
+        baud_rate = self.baud_rate if self.baud_rate is not None else self.emulator.baud_rate
+        return float(self.bits_per_byte) / baud_rate
+
+    def write(self, data):
+        data = bytes(data)
+        now = time.monotonic()
+
+        parts = data.split(b'\r\n')
+        frames = [part + b'\r\n' for part in parts[:-1]]
+        if parts[-1]:
+            frames.append(parts[-1])
+
+        # frames are answered one after the other, as soon as they are received completely
+        start = now
+        for frame in frames:
+            start += len(frame) * self.byte_time()
+            # the device does not understand frames sent at another baud rate
+            if self.baud_rate is not None and self.baud_rate != self.emulator.baud_rate:
+                continue
+
+            response = self.emulator.handle(frame)
+            ready = start + self.latency + len(response) * self.byte_time()
+            self._pending.append((ready, response))
+            start = ready
+
+        self._sent += len(data)
+
+    def _receive(self, block):
+        while self._pending:
+            ready, response = self._pending[0]
+            delay = ready - time.monotonic()
+            if self.realtime and delay > 0:
+                if not block:
+                    return
+                if delay > self.timeout:
+                    time.sleep(self.timeout)
+                    raise SerialTimeoutException()
+                time.sleep(delay)
+
+            self._pending.popleft()
+            self._buffer.extend(response)
+            if block:
+                return
+
+    def read_bytes(self, num_bytes):
+        if not self._buffer:
+            self._receive(True)
+
+        if not self._buffer:
+            if self.realtime:
+                time.sleep(self.timeout)
+            raise SerialTimeoutException()
+
+        data = bytes(self._buffer[:num_bytes])
+        del self._buffer[:num_bytes]
+        return data
+
+    def read_until(self, delimiter):
+        if not isinstance(delimiter, bytes):
+            delimiter = delimiter.encode('ascii')
+
+        while True:
+            index = self._buffer.find(delimiter)
+            if index >= 0:
+                end = index + len(delimiter)
+                data = bytes(self._buffer[:end])
+                del self._buffer[:end]
+                return data
+
+            if not self._pending:
+                if self.realtime:
+                    time.sleep(self.timeout)
+                raise SerialTimeoutException()
+
+            self._receive(True)
+
+
+class VAT590PtyEmulator(object):
+    """
+    Exposes a VAT590Emulator on a pseudo terminal, see port.
+
+    Any serial client, e.g. a VAT590Driver on a regular serial transport, can
+    open the port. Responses are delayed like in VAT590EmulatorTransport.
+    """
+
+    def __init__(self, emulator=None, latency=0.0, bits_per_byte=10):
+        self.emulator = emulator if emulator is not None else VAT590Emulator()
+        self.latency = latency
+        self.bits_per_byte = bits_per_byte
+
+        self._master, self._slave = os.openpty()
+        self.port = os.ttyname(self._slave)
+
+        self._running = False
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        import tty
+        tty.setraw(self._slave)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='VAT590PtyEmulator')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        os.close(self._slave)
+        os.close(self._master)
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def _run(self):
+        buffer = b''
+        while self._running:
+            try:
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                return
+
+            while b'\r\n' in buffer:
+                frame, buffer = buffer.split(b'\r\n', 1)
+                response = self.emulator.handle(frame + b'\r\n')
+
+                time.sleep(self.latency + len(response) * float(self.bits_per_byte) / self.emulator.baud_rate)
+                try:
+                    os.write(self._master, response)
+                except OSError:
+                    return
@@ -0,0 +1,177 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import queue
+import threading
+from collections import namedtuple
+
+from e21_util.interface import Loggable
+
+from vat_590.scheduler import VAT590PollScheduler
+
+# a transition of one field, field is None for registers without fields (errors)
+Event = namedtuple('Event', ['register', 'field', 'old', 'new', 'timestamp'])
+
+# registers which can be subscribed, with their getter and default poll rate in Hz
+REGISTERS = {
+    'device_status': ('get_device_status', 2.0),  # i:30
+    'warnings': ('get_warnings', 1.0),  # i:51
+    'errors': ('get_errors', 0.5),  # i:50
+    'assembly': ('get_assembly', 2.0),  # i:76
+}
+
+
+class Subscription(object):
+    """
+    A subscription of a VAT590EventMonitor.
+
+    Events are passed to callback, or put into queue if no callback was given.
+    """
+
+    def __init__(self, register, field, values, callback):
+        self.register = register
+        self.field = field
+        self.values = values
+        self.callback = callback
+        self.queue = queue.Queue() if callback is None else None
+
+    def matches(self, event):
+        if self.field is not None and event.field != self.field:
+            return False
+
+        return self.values is None or event.new in self.values
+
+    def get(self, timeout=None):
+        """Returns the next Event of the queue, raises queue.Empty after timeout seconds."""
+        return self.queue.get(timeout=timeout)
+
+
+class VAT590EventMonitor(Loggable):
+    """
+    Publishes transitions of the status registers to any number of subscribers.
+
+    All subscribers share the poll loop of one VAT590PollScheduler, hence
+    their number does not change the load on the serial line. A register is
+    polled as long as there is a subscription on it. Callbacks run in the
+    thread of the scheduler and must not block.
+    """
+
+    def __init__(self, scheduler, logger, rates=None, priority=5):
+        super(VAT590EventMonitor, self).__init__(logger)
+        assert isinstance(scheduler, VAT590PollScheduler)
+
+        self._scheduler = scheduler
+        self._rates = dict((name, rate) for name, (getter, rate) in REGISTERS.items())
+        if rates is not None:
+            self._rates.update(rates)
+        self.priority = priority
+
+        self._lock = threading.Lock()
+        self._subscriptions = dict((name, []) for name in REGISTERS)
+        # signals which were added by the monitor, and are removed with the last subscription
+        self._owned = set()
+
+        scheduler.add_listener(self._changed)
+
+    @classmethod
+    def for_driver(cls, driver, logger, rates=None, **kwargs):
+        """Creates the monitor with its own scheduler, see VAT590PollScheduler.for_driver."""
+        return cls(VAT590PollScheduler.for_driver(driver, logger, **kwargs), logger, rates)
+
+    @property
+    def scheduler(self):
+        """The VAT590PollScheduler which polls the registers."""
+        return self._scheduler
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self._scheduler.start()
+
+    def stop(self):
+        self._scheduler.stop()
+
+    def subscribe(self, register, field=None, callback=None, values=None):
+        """
+        Subscribes to transitions of a field of register, see REGISTERS.
+
+        field is a field of the record the getter returns, e.g. 'status' of
+        device_status, or None for every field. values limits the events to
+        transitions into one of the values, e.g. ['Fatal error'].
+        callback(event) is called with an Event, without callback the events
+        are queued in the returned Subscription.
+        """
+        if register not in REGISTERS:
+            raise ValueError("Can not subscribe to %s, see REGISTERS" % str(register))
+
+        if values is not None:
+            values = frozenset(values)
+
+        subscription = Subscription(register, field, values, callback)
+
+        with self._lock:
+            self._subscriptions[register] = self._subscriptions[register] + [subscription]
+
+            if not self._scheduler.has_signal(register):
+                rate = self._rates[register]
+                # transitions are not worth a boost of the poll rate
+                self._scheduler.add_signal(register, REGISTERS[register][0], rate, self.priority,
+                                           min_rate=min(rate, 0.1), max_rate=rate)
+                self._owned.add(register)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            register = subscription.register
+            self._subscriptions[register] = [s for s in self._subscriptions[register] if s is not subscription]
+
+            if not self._subscriptions[register] and register in self._owned:
+                self._scheduler.remove_signal(register)
+                self._owned.discard(register)
+
+    def get(self, register):
+        """Returns the latest value of the register, or None if it was not polled yet."""
+        return self._scheduler.get_value(register)
+
+    def _changed(self, name, old, new, timestamp):
+        subscriptions = self._subscriptions.get(name)
+        if not subscriptions:
+            return
+
+        if hasattr(new, '_fields'):
+            events = [Event(name, field, getattr(old, field), getattr(new, field), timestamp)
+                      for field in new._fields if getattr(old, field) != getattr(new, field)]
+        else:
+            events = [Event(name, None, old, new, timestamp)]
+
+        for event in events:
+            for subscription in subscriptions:
+                if not subscription.matches(event):
+                    continue
+
+                if subscription.queue is not None:
+                    subscription.queue.put(event)
+                    continue
+
+                try:
+                    subscription.callback(event)
+                except Exception as e:
+                    self._logger.exception('Subscriber of %s failed: %s', name, str(e))
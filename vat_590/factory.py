@@ -19,5 +19,13 @@ from vat_590.driver import VAT590Driver
 
 class VAT590Factory(object):
     @staticmethod
-    def create(transport, logger):
-        return VAT590Driver(transport, VAT590Protocol(transport, logger))
+    def create(transport, logger, commands=None):
+        return VAT590Driver(transport, VAT590Protocol(transport, logger), commands)
+
+    @staticmethod
+    def create_async(reader, writer, logger, commands=None):
+        # imported here, such that synchronous users do not pay for importing asyncio
+        from vat_590.async_protocol import AsyncVAT590Protocol
+        from vat_590.async_driver import AsyncVAT590Driver
+
+        return AsyncVAT590Driver(AsyncVAT590Protocol(reader, writer, logger), commands)
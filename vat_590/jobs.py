@@ -0,0 +1,196 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import abc
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from e21_util.error import ErrorResponse
+from e21_util.interface import Loggable
+
+from vat_590.driver import VAT590Driver
+from vat_590.events import VAT590EventMonitor
+
+# statuses which abort any procedure
+FAILURE_STATUS = frozenset(['Fatal error', 'Safety mode', 'Power failure'])
+
+# statuses a finished learn may end in
+LEARNED_STATUS = frozenset(['Position control', 'Closed', 'Opened', 'Pressure control', 'Hold'])
+
+
+class VAT590Job(Future, metaclass=abc.ABCMeta):
+    """
+    A procedure running on the valve, e.g. a learn.
+
+    The result is the device status the procedure ended in. A job fails with
+    the ErrorResponse if the valve rejected the command, with a RuntimeError
+    if the valve reports a failure, and with a TimeoutError if it did not
+    finish in time. A started job can not be cancelled.
+    """
+
+    def __init__(self, name, timeout):
+        super(VAT590Job, self).__init__()
+        self.name = name
+        self.timeout = timeout
+        # set when the command was acknowledged
+        self.started = None
+        self.status = None
+
+    def elapsed(self):
+        """Returns the seconds since the procedure was started."""
+        return time.time() - self.started
+
+    def _expired(self, timestamp):
+        return timestamp > self.started + self.timeout
+
+    @abc.abstractmethod
+    def _update(self, status, started):
+        """Follows the device status of a poll which began at started, after the command."""
+
+    def _finish(self, status):
+        if not self.done():
+            self.set_result(status)
+
+    def _fail(self, error):
+        if not self.done():
+            self.set_exception(error)
+
+
+class _LearnJob(VAT590Job):
+    def __init__(self, timeout, start_timeout):
+        super(_LearnJob, self).__init__('learn', timeout)
+        self.start_timeout = start_timeout
+        self.learning = False
+
+    def _update(self, status, started):
+        self.status = status
+
+        if status == 'Learn':
+            self.learning = True
+        elif status in FAILURE_STATUS:
+            self._fail(RuntimeError("Learn aborted, the valve is in %s" % status))
+        elif self.learning:
+            if status in LEARNED_STATUS:
+                self._finish(status)
+            else:
+                self._fail(RuntimeError("Learn interrupted, the valve is in %s" % status))
+        elif started > self.started + self.start_timeout:
+            self._fail(RuntimeError("Learn did not start, the valve is in %s" % status))
+
+
+class _CommandJob(VAT590Job):
+    # the valve reports no progress, the job ends with the first status read after the command
+    def _update(self, status, started):
+        self.status = status
+
+        if status in FAILURE_STATUS:
+            self._fail(RuntimeError("%s failed, the valve is in %s" % (self.name, status)))
+        else:
+            self._finish(status)
+
+
+class VAT590JobRunner(Loggable):
+    """
+    Runs learn, zero and pressure alignment without blocking the caller.
+
+    The command is written by the calling thread, then the job follows the
+    device status polled by the VAT590EventMonitor, which keeps serving all
+    other reads of the port. Jobs are only updated while its scheduler runs.
+    """
+
+    def __init__(self, driver, monitor, logger):
+        super(VAT590JobRunner, self).__init__(logger)
+        assert isinstance(driver, VAT590Driver)
+        assert isinstance(monitor, VAT590EventMonitor)
+
+        self._driver = driver
+        self._monitor = monitor
+
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._subscription = None
+
+        monitor.scheduler.add_poll_listener(self._polled)
+
+    def learn(self, setpoint, timeout=600.0, start_timeout=10.0):
+        """Starts a learn (L:), the job fails if the valve does not enter Learn within start_timeout."""
+        return self._start(_LearnJob(timeout, start_timeout), 'learn', self._driver._learn_data(setpoint))
+
+    def zero(self, timeout=30.0):
+        """Starts the zero adjustment of the sensor (Z:)."""
+        return self._start(_CommandJob('zero', timeout), 'zero', '')
+
+    def pressure_alignment(self, setpoint, timeout=30.0):
+        """Starts the pressure alignment (c:6002)."""
+        return self._start(_CommandJob('pressure alignment', timeout), 'pressure_alignment',
+                           self._driver._pressure_data(setpoint))
+
+    def get_jobs(self):
+        """Returns the jobs which are not done yet."""
+        with self._lock:
+            return list(self._jobs)
+
+    def _start(self, job, name, *datas):
+        # a running Future can not be cancelled anymore, cancel() would race with the poll thread
+        job.set_running_or_notify_cancel()
+        try:
+            self._driver._write_checked(name, *datas)
+        except ErrorResponse as e:
+            # e.g. in local operation, the device status would not tell
+            job.started = time.time()
+            job._fail(e)
+            self._logger.warning('The valve rejected %s: %s', job.name, str(e))
+            return job
+
+        job.started = time.time()
+
+        with self._lock:
+            # keeps the device status polled while a job runs
+            if self._subscription is None:
+                self._subscription = self._monitor.subscribe('device_status', 'status', callback=_ignore)
+            self._jobs.append(job)
+
+        self._logger.info('Started %s', job.name)
+        return job
+
+    def _remove(self, job):
+        with self._lock:
+            if job in self._jobs:
+                self._jobs.remove(job)
+
+            if not self._jobs and self._subscription is not None:
+                self._monitor.unsubscribe(self._subscription)
+                self._subscription = None
+
+    def _polled(self, name, reading, started):
+        # every poll checks the timeouts, also while the valve does not respond
+        now = time.time()
+        for job in self.get_jobs():
+            if not job.done():
+                if job._expired(now):
+                    job._fail(TimeoutError("%s did not finish within the timeout" % job.name))
+                # only a poll begun after the command reflects it
+                elif name == 'device_status' and reading is not None and started > job.started:
+                    job._update(reading.value.status, started)
+
+            if job.done():
+                if not job.cancelled() and job.exception() is None:
+                    self._logger.info('Finished %s after %.1f s', job.name, job.elapsed())
+                self._remove(job)
+
+
+def _ignore(event):
+    pass
@@ -0,0 +1,52 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Timing of the serial line, derived from the interface configuration (i:20).
+
+from vat_590.constants import BAUD_RATE
+
+
+def baud_rate(name):
+    """Returns the bit/s of a BAUD_RATE name, e.g. 19200 for '19.2k'."""
+    if name not in BAUD_RATE:
+        raise ValueError("Unknown baud rate %s, see BAUD_RATE" % str(name))
+
+    if name.endswith('k'):
+        return int(float(name[:-1]) * 1000)
+    return int(name)
+
+
+# baud rate names ordered from the slowest to the fastest
+BAUD_RATE_ORDER = sorted(BAUD_RATE.keys(), key=baud_rate)
+
+
+def bits_per_character(interface_configuration):
+    """Returns start, data, parity and stop bits of one character."""
+    baud, parity, data_length, stop_bits = interface_configuration[0:4]
+
+    bits = 1 + int(data_length.split()[0]) + int(stop_bits)
+    if parity != 'no':
+        bits += 1
+    return bits
+
+
+def character_time(interface_configuration):
+    """Returns the seconds one character takes on the line."""
+    return float(bits_per_character(interface_configuration)) / baud_rate(interface_configuration[0])
+
+
+def default_character_time(baud=9600):
+    """Returns the seconds of one character with 8 data bits, no parity and 1 stop bit."""
+    return 10.0 / baud
@@ -0,0 +1,149 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from collections import namedtuple
+
+from e21_util.error import CommunicationError, ErrorResponse
+from e21_util.interface import Loggable
+
+from vat_590.driver import VAT590Driver
+from vat_590.line import BAUD_RATE_ORDER, baud_rate
+from vat_590.scheduler import POLL_CHARACTERS
+
+# baud_rate in bit/s, round_trip in seconds, throughput in characters per second
+LinkProbe = namedtuple('LinkProbe', ['baud_rate', 'round_trip', 'polls_per_second', 'throughput'])
+
+
+class VAT590LinkTuner(Loggable):
+    """
+    Measures the serial link and raises the baud rate of valve and transport.
+
+    set_baud_rate(bps) switches the local transport, e.g. the baudrate of
+    the serial port. Changing the interface configuration (s:20) only takes
+    effect on the device, the transport has to follow.
+    """
+
+    def __init__(self, driver, logger, set_baud_rate, settle=0.05, attempts=5):
+        super(VAT590LinkTuner, self).__init__(logger)
+        assert isinstance(driver, VAT590Driver)
+
+        self._driver = driver
+        self._set_baud_rate = set_baud_rate
+        self.settle = settle
+        self.attempts = attempts
+
+    def probe(self, count=20):
+        """Measures the round trip of single pressure reads and the throughput of pipelined ones."""
+        driver = self._driver
+
+        round_trips = []
+        for _ in range(count):
+            start = time.perf_counter()
+            driver.get_pressure()
+            round_trips.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        driver.query_many(['get_pressure'] * count)
+        elapsed = time.perf_counter() - start
+
+        round_trips.sort()
+        configuration = driver.get_interface_configuration()
+
+        return LinkProbe(baud_rate(configuration[0]), round_trips[len(round_trips) // 2], count / elapsed,
+                         count * POLL_CHARACTERS['get_pressure'] / elapsed)
+
+    def upgrade(self, rates=None, burst=50):
+        """
+        Switches to the fastest of rates (names of BAUD_RATE) that passes a verification burst.
+
+        By default all rates faster than the current one are tried. The rates
+        are stepped up one after the other and the first one which fails ends
+        the upgrade, valve and transport then return to the last verified
+        rate. Stepping up keeps the fallback on a link which carried the
+        previous rate. Returns the LinkProbe before and after the upgrade.
+        """
+        configuration = self._driver.get_interface_configuration()
+        current = configuration[0]
+        before = self.probe()
+
+        if rates is None:
+            rates = BAUD_RATE_ORDER
+
+        for rate in sorted(rates, key=baud_rate):
+            if baud_rate(rate) <= baud_rate(configuration[0]):
+                continue
+
+            upgraded = self._switch(configuration, rate, burst)
+            if upgraded is None:
+                break
+            configuration = upgraded
+
+        if configuration[0] == current:
+            return before, before
+
+        after = self.probe()
+        self._logger.info('Switched from %s to %s baud, %.0f instead of %.0f polls/s',
+                          current, configuration[0], after.polls_per_second, before.polls_per_second)
+        return before, after
+
+    def _switch(self, configuration, rate, burst):
+        # returns the new configuration, or None after returning to the given one
+        upgraded = list(configuration)
+        upgraded[0] = rate
+
+        try:
+            # the valve may switch although its acknowledge is lost
+            self._driver.set_interface_configuration(upgraded)
+            self._set_baud_rate(baud_rate(rate))
+            time.sleep(self.settle)
+
+            self._verify(upgraded, burst)
+            return upgraded
+        except (CommunicationError, ErrorResponse, ValueError) as e:
+            self._logger.warning('Switching to %s baud failed: %s', rate, str(e))
+
+        self._restore(configuration, rate)
+        return None
+
+    def _verify(self, configuration, burst):
+        # a burst of back to back frames, every one has to arrive intact
+        for value in self._driver.query_many(['get_interface_configuration'] * burst):
+            if value != configuration:
+                raise ValueError("Read %s instead of the written interface configuration" % str(value))
+
+    def _restore(self, configuration, rate):
+        error = None
+        for _ in range(self.attempts):
+            # the valve may have switched although the link garbles frames at that rate
+            self._set_baud_rate(baud_rate(rate))
+            try:
+                self._driver.set_interface_configuration(configuration)
+            except CommunicationError:
+                pass
+
+            self._set_baud_rate(baud_rate(configuration[0]))
+            time.sleep(self.settle)
+
+            # responses to garbled frames may still be in flight
+            self._driver.clear()
+
+            try:
+                self._verify(configuration, 1)
+                return
+            except (CommunicationError, ErrorResponse, ValueError) as e:
+                error = e
+
+        raise CommunicationError("Could not return to %s baud: %s" % (configuration[0], str(error)))
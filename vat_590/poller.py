@@ -0,0 +1,179 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import namedtuple
+
+from e21_util.interface import Loggable
+
+from vat_590.driver import VAT590Driver
+
+VAT590Sample = namedtuple('VAT590Sample', [
+    'timestamp',  # time.time() when the assembly was received
+    'position',
+    'pressure',  # signed, see PRESSURE_READING
+    'operation_mode',
+    'status',
+    'warning'
+])
+
+
+def sample_from_assembly(assembly, timestamp):
+    position, sign, pressure, operation_mode, status, warning = assembly
+
+    pressure = int(pressure)
+    if sign == 'Negative':
+        pressure = -pressure
+
+    return VAT590Sample(timestamp, int(position), pressure, operation_mode, status, warning)
+
+
+class VAT590Poller(Loggable):
+    """
+    Polls the assembly (i:76) in a background thread and caches the latest sample.
+
+    Readers get the cached values without touching the serial port, hence
+    the serial load does not depend on the number of readers.
+    """
+
+    def __init__(self, driver, logger, rate=10.0):
+        super(VAT590Poller, self).__init__(logger)
+        assert isinstance(driver, VAT590Driver)
+
+        if rate <= 0:
+            raise ValueError("rate must be positive, given: %s" % str(rate))
+
+        self._driver = driver
+        self._interval = 1.0 / rate
+
+        self._condition = threading.Condition()
+        self._sample = None
+        self._received = None
+        self._error = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def set_rate(self, rate):
+        if rate <= 0:
+            raise ValueError("rate must be positive, given: %s" % str(rate))
+
+        self._interval = 1.0 / rate
+
+    def start(self):
+        if self.is_running():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='VAT590Poller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        deadline = time.monotonic()
+
+        while not self._stop.is_set():
+            self.poll()
+
+            deadline += self._interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # we are behind, do not try to catch up with a burst of polls
+                deadline = time.monotonic()
+                delay = 0
+
+            self._stop.wait(delay)
+
+    def poll(self):
+        """Polls the assembly once and updates the cache."""
+        try:
+            sample = sample_from_assembly(self._driver.get_assembly(), time.time())
+        except Exception as e:
+            self._logger.warning('Could not poll assembly: %s', str(e))
+            with self._condition:
+                self._error = e
+            return None
+
+        with self._condition:
+            self._sample = sample
+            self._received = time.monotonic()
+            self._error = None
+            self._condition.notify_all()
+
+        return sample
+
+    def get_sample(self):
+        """Returns the latest VAT590Sample, or None if no poll succeeded yet."""
+        return self._sample
+
+    def get_age(self):
+        """Returns the seconds since the latest sample was received, or None."""
+        received = self._received
+        if received is None:
+            return None
+
+        return time.monotonic() - received
+
+    def get_error(self):
+        """Returns the exception of the last poll, or None if it succeeded."""
+        return self._error
+
+    def wait_for_sample(self, timeout=None):
+        """Blocks until the next sample arrives and returns it, or None on timeout."""
+        with self._condition:
+            current = self._sample
+            self._condition.wait_for(lambda: self._sample is not current, timeout)
+            if self._sample is current:
+                return None
+            return self._sample
+
+    def get_position(self):
+        return self._cached('position')
+
+    def get_pressure(self):
+        return self._cached('pressure')
+
+    def get_operation_mode(self):
+        return self._cached('operation_mode')
+
+    def get_status(self):
+        return self._cached('status')
+
+    def get_warning(self):
+        return self._cached('warning')
+
+    def _cached(self, field):
+        sample = self._sample
+        if sample is None:
+            return None
+
+        return getattr(sample, field)
@@ -0,0 +1,166 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from vat_590.driver import VAT590Driver
+
+# outcome of an operation on one valve, error is None if it succeeded
+PoolResult = namedtuple('PoolResult', ['name', 'value', 'error'])
+
+
+class VAT590Pool(object):
+    """
+    Runs an operation on many valves concurrently.
+
+    Drivers are registered by name. Valves on different transports are served
+    in parallel by a bounded worker pool, valves sharing a transport are
+    served one after the other by the same worker, since they would queue on
+    the transport lock anyway. Hence a fleet operation takes about one round
+    trip per valve on the busiest port.
+    """
+
+    def __init__(self, drivers=None, max_workers=16):
+        self._drivers = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        if drivers is not None:
+            for name, driver in dict(drivers).items():
+                self.add(name, driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def __len__(self):
+        return len(self._drivers)
+
+    def __contains__(self, name):
+        return name in self._drivers
+
+    def add(self, name, driver):
+        assert isinstance(driver, VAT590Driver)
+
+        with self._lock:
+            if name in self._drivers:
+                raise ValueError("Valve %s is already in the pool" % str(name))
+            self._drivers[name] = driver
+
+    def remove(self, name):
+        with self._lock:
+            return self._drivers.pop(name)
+
+    def get(self, name):
+        return self._drivers[name]
+
+    def get_names(self):
+        return list(self._drivers.keys())
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
+
+    def call(self, method, *args, **kwargs):
+        """
+        Calls the driver method on all valves.
+
+        Returns an OrderedDict of PoolResult by valve name.
+        """
+        return self.call_on(self.get_names(), method, *args, **kwargs)
+
+    def call_on(self, names, method, *args, **kwargs):
+        """Calls the driver method on the given valves, see call."""
+        return self._dispatch(names, lambda name, driver: getattr(driver, method)(*args, **kwargs))
+
+    def apply(self, function, names=None, arguments=None):
+        """
+        Calls function(driver, *arguments[name]) on the given valves, by default all.
+
+        arguments maps valve names to their argument tuple, valves without
+        entry get no arguments. Returns an OrderedDict of PoolResult by valve
+        name, see call.
+        """
+        if names is None:
+            names = self.get_names()
+        if arguments is None:
+            arguments = {}
+
+        return self._dispatch(names, lambda name, driver: function(driver, *arguments.get(name, ())))
+
+    def _dispatch(self, names, task):
+        with self._lock:
+            drivers = [(name, self._drivers[name]) for name in names]
+
+        # one task per transport, since a transport serves one round trip at a time
+        groups = OrderedDict()
+        for name, driver in drivers:
+            groups.setdefault(id(driver._transport), []).append((name, driver))
+
+        futures = [self._executor.submit(self._run, group, task) for group in groups.values()]
+
+        results = {}
+        for future in futures:
+            for result in future.result():
+                results[result.name] = result
+
+        return OrderedDict((name, results[name]) for name, driver in drivers)
+
+    def _run(self, group, task):
+        results = []
+        for name, driver in group:
+            try:
+                results.append(PoolResult(name, task(name, driver), None))
+            except Exception as e:
+                results.append(PoolResult(name, None, e))
+        return results
+
+    @staticmethod
+    def failed(results):
+        """Returns the failed PoolResults of a call by valve name."""
+        return OrderedDict((name, result) for name, result in results.items() if result.error is not None)
+
+    def close(self):
+        return self.call('close')
+
+    def open(self):
+        return self.call('open')
+
+    def hold(self):
+        return self.call('hold')
+
+    def reset(self, mode=None):
+        return self.call('reset', mode)
+
+    def get_assembly(self):
+        return self.call('get_assembly')
+
+    def get_pressure(self):
+        return self.call('get_pressure')
+
+    def get_position(self):
+        return self.call('get_position')
+
+    def get_device_status(self):
+        return self.call('get_device_status')
+
+    def get_warnings(self):
+        return self.call('get_warnings')
+
+    def get_errors(self):
+        return self.call('get_errors')
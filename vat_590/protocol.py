@@ -13,72 +13,371 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
+import time
+
 from e21_util.lock import InterProcessTransportLock
 from e21_util.error import CommunicationError, ErrorResponse
 from e21_util.serial_connection import AbstractTransport, SerialTimeoutException
 from e21_util.interface import Loggable
 
-class VAT590Protocol(Loggable):
-
-    def __init__(self, transport, logger):
-        super(VAT590Protocol, self).__init__(logger)
-        assert isinstance(transport, AbstractTransport)
+from vat_590.statistics import ProtocolStatistics
+from vat_590.trace import ProtocolTrace
 
-        self._transport = transport
+class VAT590Framing(Loggable):
+    """
+    Framing of the VAT 590 ASCII protocol, independent of how bytes are moved.
+    """
 
+    def __init__(self, logger):
+        super(VAT590Framing, self).__init__(logger)
         self.encoding = 'ascii'
 
+        # encoded frames of commands without data, by header
+        self._frames = {}
+
     def create_message(self, header, *data):
-        msg = []
-        msg.append(header)
-        msg.extend(data)
-        msg.append("\r\n")
-        return ''.join(msg).encode(self.encoding)
+        if data and any(data):
+            return (header + "".join(data) + "\r\n").encode(self.encoding)
+
+        frame = self._frames.get(header)
+        if frame is None:
+            frame = self._frames[header] = (header + "\r\n").encode(self.encoding)
+        return frame
 
     def parse_response(self, response, header):
+        # decoding the short frame once is cheaper than slicing bytes
         response = response.decode(self.encoding)
 
-        if response.startswith('E:'):
+        if response[:2] == 'E:':
             raise ErrorResponse(response)
 
-        if not response.startswith(header[0]):
+        if response[:1] != header[0]:
             raise ValueError('Response header mismatch: received "' + str(response) + '" expected: "' + str(header[0]) + '"')
 
-        response = response[len(header):]
-        return response.split(None)
+        return response[len(header):].split(None)
+
+    def _is_debug(self):
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+
+class VAT590Protocol(VAT590Framing):
+
+    def __init__(self, transport, logger, max_pipelined=4):
+        super(VAT590Protocol, self).__init__(logger)
+        assert isinstance(transport, AbstractTransport)
+
+        if max_pipelined < 1:
+            raise ValueError("max_pipelined must be positive, given: %s" % str(max_pipelined))
+
+        self._transport = transport
+
+        # frames query_many sends back to back
+        self.max_pipelined = max_pipelined
+
+        # ProtocolStatistics while enabled, see enable_statistics
+        self.statistics = None
+
+        # (retries, backoff, max_backoff, max_skipped) while enabled, see enable_resync
+        self._resync = None
+
+        # ProtocolTrace while enabled, see enable_trace. The trace is kept by
+        # default, it costs one timestamp and append per frame.
+        self.trace = ProtocolTrace()
+        # reason of a failure whose trace is dumped after the transport is released
+        self._dump_reason = None
 
     def read_response(self):
         try:
             # remove the last two bytes since they are just \r\n
-            resp = self._transport.read_until("\r\n")[0:-2]
-            self._logger.debug('Response: "%s"', repr(resp))
-            return resp
+            resp = self._transport.read_until("\r\n")[:-2]
         except:
+            self._failed("Could not read response")
             raise CommunicationError("Could not read response")
 
+        if self._is_debug():
+            self._logger.debug('Response: "%s"', repr(resp))
+
+        trace = self.trace
+        if trace is not None:
+            trace.received(resp)
+            if resp[:2] == b'E:':
+                self._failed("Error response " + resp.decode(self.encoding, 'replace'))
+
+        return resp
+
     def send_message(self, raw_data):
+        trace = self.trace
+        if trace is not None:
+            trace.sent(raw_data)
+
         try:
-            self._logger.debug('Sending: "%s"', repr(raw_data))
+            if self._is_debug():
+                self._logger.debug('Sending: "%s"', repr(raw_data))
             self._transport.write(raw_data)
         except:
+            self._failed("Could not send data")
             raise CommunicationError("Could not send data")
 
-    def query(self, transport, header, *data):
-        with self._transport:
-            message = self.create_message(header, *data)
-            self.send_message(message)
+    def _failed(self, reason):
+        # called while the transport is locked, the trace is dumped by _exchange
+        if self.trace is not None and self._dump_reason is None:
+            self._dump_reason = reason
+
+    def _dump_trace(self):
+        reason = self._dump_reason
+        self._dump_reason = None
+
+        trace = self.trace
+        if trace is None or reason is None:
+            return
+
+        try:
+            path = trace.failed(reason)
+        except Exception as e:
+            self._logger.warning('Could not dump the protocol trace: %s', str(e))
+            return
+
+        if path is not None:
+            self._logger.warning('%s, dumped the protocol trace to %s', reason, path)
+
+    def enable_trace(self, size=4096, directory=None, min_interval=10.0):
+        """
+        Records the last size frames, see ProtocolTrace.
+
+        The trace is enabled with the defaults on creation. With directory,
+        the trace is dumped there on communication errors and E: responses.
+        """
+        trace = self.trace
+        if trace is None or trace.size != size:
+            self.trace = ProtocolTrace(size, directory, min_interval)
+        else:
+            trace.directory = directory
+            trace.min_interval = min_interval
+        return self.trace
+
+    def disable_trace(self):
+        self.trace = None
+
+    def enable_statistics(self):
+        if self.statistics is None:
+            self.statistics = ProtocolStatistics()
+        return self.statistics
+
+    def disable_statistics(self):
+        self.statistics = None
+
+    def enable_resync(self, retries=3, backoff=0.005, max_backoff=0.1, max_skipped=4):
+        """
+        Recovers from framing errors without waiting for clear().
+
+        Responses are matched by their full header. Frames of other commands,
+        e.g. late responses of an earlier exchange, are dropped (up to
+        max_skipped per response) and bytes before the expected header are
+        cut off. Queries whose response could not be read are sent again up
+        to retries times, waiting backoff seconds doubled after every attempt
+        and bounded by max_backoff. Before a query is sent again, the input
+        is cleared, which takes one read timeout.
+        """
+        if retries < 0 or max_skipped < 0:
+            raise ValueError("retries and max_skipped must not be negative")
+
+        self._resync = (retries, backoff, max_backoff, max_skipped)
+
+    def disable_resync(self):
+        self._resync = None
+
+    def _synchronize(self, header, response, max_skipped):
+        # drops stale frames and garbage until the response of header
+        expected = header.encode(self.encoding)
+        skipped = 0
+
+        while True:
+            # the rest of a truncated frame before the response, data never contains ':'
+            index = max(response.rfind(expected), response.rfind(b'E:'))
+            if index == 0:
+                return response
+
+            if index > 0:
+                self._logger.warning('Dropped "%s" before the response of %s', repr(response[:index]), header)
+                self._record_resync(header)
+                return response[index:]
+
+            if skipped == max_skipped:
+                self._failed("Lost the frame boundary, no response of " + header)
+                raise CommunicationError("Lost the frame boundary, no response of " + header)
+
+            self._logger.warning('Dropped frame "%s" while waiting for %s', repr(response), header)
+            self._record_resync(header)
+            skipped += 1
             response = self.read_response()
 
-            return self.parse_response(response, header)
+    def _record_resync(self, header):
+        statistics = self.statistics
+        if statistics is not None:
+            statistics.record_resync(header)
 
-    def write(self, transport, header, *data):
-        with self._transport:
-            message = self.create_message(header, *data)
-            self.send_message(message)
+    def _read_responses(self, headers, arrivals=None):
+        # arrivals collects the time every response was read
+        resync = self._resync
+        responses = []
+        for header in headers:
             response = self.read_response()
-            if len(response) > 0:
-                self._logger.error('Received Unexpected response data: "%s"', repr(response))
-    #                raise CommunicationError('Unexpected response data')
+            # headers of None accept any response
+            if resync is not None and header is not None:
+                response = self._synchronize(header, response, resync[3])
+            responses.append(response)
+            if arrivals is not None:
+                arrivals.append(time.perf_counter())
+
+        return responses
+
+    def _transfer(self, chunks, arrivals=None):
+        # sends the chunks of (message, headers) one after the other, reading
+        # the responses of a chunk before the next one. Returns the responses
+        # and the time the first chunk was written.
+        responses = []
+        written = None
+        for message, headers in chunks:
+            self.send_message(message)
+            if written is None:
+                written = time.perf_counter()
+            responses.extend(self._read_responses(headers, arrivals))
+
+        return responses, written
+
+    def _exchange(self, header, chunks, sizes=None):
+        try:
+            return self._exchange_locked(header, chunks, sizes)
+        finally:
+            # writing the file must not hold the port
+            if self._dump_reason is not None:
+                self._dump_trace()
+
+    def _exchange_locked(self, header, chunks, sizes=None):
+        # sends the chunks and reads their responses within one lock of the transport
+        statistics = self.statistics
+        if statistics is None:
+            with self._transport:
+                return self._transfer(chunks)[0]
+
+        # a pipelined batch is recorded by the header of every request,
+        # sizes holds the length of their frames
+        batch = sizes is not None
+        headers = [request for message, requests in chunks for request in requests]
+        arrivals = []
+        try:
+            start = time.perf_counter()
+            with self._transport:
+                locked = time.perf_counter()
+                responses, written = self._transfer(chunks, arrivals)
+        except CommunicationError:
+            for failed in (headers if batch else [header]):
+                statistics.record_failure(failed)
+            raise
+
+        if not batch:
+            statistics.record(header, locked - start, written - locked, arrivals[-1] - written,
+                              len(chunks[0][0]), sum(len(response) + 2 for response in responses))
+        else:
+            # the lock wait and first write of the batch, and the read since the previous response
+            previous = written
+            for request, size, response, arrival in zip(headers, sizes, responses, arrivals):
+                statistics.record(request, locked - start, written - locked, arrival - previous,
+                                  size, len(response) + 2)
+                previous = arrival
+
+        for request, response in zip(headers if batch else [header] * len(responses), responses):
+            if response[:2] == b'E:':
+                statistics.record_error(request, response)
+
+        return responses
+
+    def query(self, transport, header, *data):
+        message = self.create_message(header, *data)
+        if self._resync is None:
+            response = self._exchange(header, [(message, [header])])[0]
+        else:
+            response = self._exchange_retry(header, message)
+
+        return self.parse_response(response, header)
+
+    def _exchange_retry(self, header, message):
+        retries, delay, max_backoff, max_skipped = self._resync
+
+        attempt = 0
+        while True:
+            try:
+                return self._exchange(header, [(message, [header])])[0]
+            except CommunicationError as e:
+                if attempt >= retries:
+                    raise
+
+                attempt += 1
+                self._logger.warning('Retrying %s (%d/%d): %s', header, attempt, retries, str(e))
+                self._record_resync(header)
+                time.sleep(delay)
+                delay = min(delay * 2, max_backoff)
+
+                # the late response of the failed attempt has the same header,
+                # it would be taken for the response of the retry
+                self.clear()
+
+    def query_many(self, transport, requests):
+        """
+        Pipelines several queries, given as (header, data) tuples.
+
+        Up to max_pipelined frames are sent back to back, then their
+        responses are read in order before the next frames are sent, all
+        within one lock of the transport. More frames at once can overflow
+        the input buffer of the device (E:000002). Returns a list with the
+        parsed response for each request, or the exception which parsing
+        that response raised (e.g. an ErrorResponse for an E: reply).
+        """
+        messages = [self.create_message(header, *data) for header, data in requests]
+        headers = [header for header, data in requests]
+        step = self.max_pipelined
+        chunks = [(b''.join(messages[i:i + step]), headers[i:i + step]) for i in range(0, len(messages), step)]
+
+        responses = self._exchange(','.join(headers), chunks, [len(message) for message in messages])
+
+        results = []
+        for (header, data), response in zip(requests, responses):
+            try:
+                results.append(self.parse_response(response, header))
+            except (ErrorResponse, ValueError) as e:
+                results.append(e)
+
+        return results
+
+    def write(self, transport, header, *data):
+        # the acknowledge is not synchronized, a stale frame left behind is
+        # dropped by the next query. Writes are not sent again either, e.g. a
+        # second learn (L:) would restart the learn cycle.
+        message = self.create_message(header, *data)
+        response = self._exchange(header, [(message, [None])])[0]
+        if len(response) > 0:
+            self._logger.error('Received Unexpected response data: "%s"', repr(response))
+    #            raise CommunicationError('Unexpected response data')
+
+    def write_acknowledged(self, transport, header, *data):
+        """
+        Writes like write, but checks the acknowledge of the device.
+
+        Raises an ErrorResponse if the device rejected the command with an
+        E: response, and a CommunicationError if it did not echo the header.
+        """
+        # the device echoes the command, without data, e.g. L: for L:0 and its data
+        echo = header[:2] if header[:1].isupper() else header
+
+        message = self.create_message(header, *data)
+        response = self._exchange(header, [(message, [echo])])[0].decode(self.encoding, 'replace')
+
+        if response[:2] == 'E:':
+            raise ErrorResponse(response)
+
+        if response != echo:
+            raise CommunicationError('Unexpected acknowledge "%s" of %s' % (response, header))
 
     def clear(self):
         with self._transport:
@@ -0,0 +1,310 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import namedtuple
+
+from e21_util.interface import Loggable
+
+from vat_590.driver import VAT590Driver
+from vat_590.line import character_time, default_character_time
+
+Reading = namedtuple('Reading', ['value', 'timestamp'])
+
+# characters of request and response, including CRLF, of the pollable getters
+POLL_CHARACTERS = {
+    'get_pressure': 4 + 12,
+    'get_position': 4 + 10,
+    'get_assembly': 6 + 23,
+    'get_device_status': 6 + 10,
+    'get_warnings': 6 + 10,
+    'get_errors': 6 + 14,
+    'get_sensor_reading': 6 + 13,
+}
+
+
+class _Signal(object):
+    def __init__(self, name, getter, rate, priority, min_rate, max_rate, characters, deadband):
+        self.name = name
+        self.getter = getter
+        self.rate = float(rate)
+        self.priority = priority
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.characters = characters
+        self.deadband = deadband
+
+        self.granted = self.rate
+        self.boosted_until = 0.0
+        self.next_due = 0.0
+        self.reading = None
+
+
+class VAT590PollScheduler(Loggable):
+    """
+    Polls several signals of one valve, each at its own rate, within the line capacity.
+
+    Every signal has a target rate and a priority. The time a poll occupies
+    the line follows from the request and response length at the configured
+    baud rate, plus the turnaround of the device. If the targets exceed the
+    share `utilization` of the line, the minimum rates are granted first and
+    the rest is handed out by descending priority. A signal whose value
+    changed is polled at `boost` times its target rate (up to its max_rate)
+    for `boost_hold` seconds.
+    """
+
+    def __init__(self, driver, logger, interface_configuration=None, utilization=0.8, turnaround=0.005,
+                 boost=4.0, boost_hold=2.0):
+        super(VAT590PollScheduler, self).__init__(logger)
+        assert isinstance(driver, VAT590Driver)
+
+        self._driver = driver
+        self.utilization = utilization
+        self.turnaround = turnaround
+        self.boost = boost
+        self.boost_hold = boost_hold
+
+        if interface_configuration is None:
+            self._character_time = default_character_time()
+        else:
+            self._character_time = character_time(interface_configuration)
+
+        self._lock = threading.Lock()
+        self._signals = {}
+        self._listeners = []
+        self._poll_listeners = []
+
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_driver(cls, driver, logger, **kwargs):
+        """Creates the scheduler with the line timing read from the interface configuration."""
+        return cls(driver, logger, driver.get_interface_configuration(), **kwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def add_signal(self, name, getter, rate, priority=0, min_rate=0.1, max_rate=None, characters=None, deadband=0):
+        """
+        Polls the driver getter as signal name with the target rate in Hz.
+
+        characters is the length of request and response, it defaults to
+        POLL_CHARACTERS of the getter. Numeric signals are only boosted by
+        changes larger than deadband.
+        """
+        if characters is None:
+            if getter not in POLL_CHARACTERS:
+                raise ValueError("Length of %s unknown, give the characters of request and response" % getter)
+            characters = POLL_CHARACTERS[getter]
+
+        if rate <= 0 or min_rate <= 0 or min_rate > rate:
+            raise ValueError("rates must be positive and min_rate <= rate")
+
+        if max_rate is None:
+            max_rate = rate * self.boost
+
+        with self._lock:
+            now = time.monotonic()
+            signal = _Signal(name, getter, rate, priority, min_rate, max(max_rate, rate), characters, deadband)
+            signal.next_due = now
+            self._signals[name] = signal
+            self._allocate(now)
+
+        self._wakeup.set()
+
+    def remove_signal(self, name):
+        with self._lock:
+            del self._signals[name]
+            self._allocate(time.monotonic())
+
+    def has_signal(self, name):
+        return name in self._signals
+
+    def add_listener(self, listener):
+        """Calls listener(name, old, new, timestamp) whenever a signal changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def add_poll_listener(self, listener):
+        """
+        Calls listener(name, reading, started) after every poll of a signal.
+
+        reading is None if the poll failed, started is the time.time() the
+        poll began.
+        """
+        self._poll_listeners.append(listener)
+
+    def remove_poll_listener(self, listener):
+        self._poll_listeners.remove(listener)
+
+    def poll_time(self, characters):
+        """Returns the seconds one poll of that many characters occupies the line."""
+        return characters * self._character_time + self.turnaround
+
+    def get(self, name):
+        """Returns the latest Reading of the signal, or None."""
+        signal = self._signals.get(name)
+        return None if signal is None else signal.reading
+
+    def get_value(self, name):
+        reading = self.get(name)
+        return None if reading is None else reading.value
+
+    def get_rates(self):
+        """Returns the currently granted rate of each signal in Hz."""
+        with self._lock:
+            return dict((name, signal.granted) for name, signal in self._signals.items())
+
+    def get_load(self):
+        """Returns the share of the line the granted rates occupy."""
+        with self._lock:
+            return sum(signal.granted * self.poll_time(signal.characters) for signal in self._signals.values())
+
+    def _allocate(self, now):
+        # every signal gets its minimum rate, the rest of the budget goes by priority
+        signals = list(self._signals.values())
+        budget = self.utilization
+
+        for signal in signals:
+            signal.granted = signal.min_rate
+            budget -= signal.min_rate * self.poll_time(signal.characters)
+
+        for priority in sorted(set(signal.priority for signal in signals), reverse=True):
+            group = [signal for signal in signals if signal.priority == priority]
+
+            wanted = []
+            for signal in group:
+                rate = signal.rate
+                if signal.boosted_until > now:
+                    rate = min(rate * self.boost, signal.max_rate)
+                wanted.append(rate - signal.min_rate)
+
+            cost = sum(extra * self.poll_time(signal.characters) for signal, extra in zip(group, wanted))
+            scale = 1.0 if cost <= budget else max(budget, 0.0) / cost
+
+            for signal, extra in zip(group, wanted):
+                signal.granted += extra * scale
+            budget -= cost * scale
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='VAT590PollScheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _next(self):
+        with self._lock:
+            if not self._signals:
+                return None, None
+
+            # earliest due first, the higher priority wins a tie
+            signal = min(self._signals.values(), key=lambda s: (s.next_due, -s.priority))
+            return signal, signal.next_due
+
+    def _run(self):
+        while not self._stop.is_set():
+            signal, due = self._next()
+            now = time.monotonic()
+
+            if signal is None or due > now:
+                self._wakeup.clear()
+                self._wakeup.wait(None if signal is None else due - now)
+                continue
+
+            try:
+                self.poll(signal.name)
+            except Exception as e:
+                # keeps polling the other signals
+                self._logger.exception('Poll of %s failed: %s', signal.name, str(e))
+
+    def poll(self, name):
+        """Polls the signal once and schedules its next poll, returns None if the signal was removed."""
+        with self._lock:
+            signal = self._signals.get(name)
+        if signal is None:
+            return None
+
+        started = time.time()
+        try:
+            value = getattr(self._driver, signal.getter)()
+        except Exception as e:
+            self._logger.warning('Could not poll %s: %s', name, str(e))
+            value = None
+            failed = True
+        else:
+            failed = False
+
+        now = time.monotonic()
+        timestamp = time.time()
+        changed = False
+        significant = False
+
+        with self._lock:
+            old = signal.reading
+            if not failed:
+                signal.reading = Reading(value, timestamp)
+                changed = old is not None and old.value != value
+                significant = changed
+                if changed and signal.deadband and isinstance(value, (int, float)):
+                    significant = abs(value - old.value) > signal.deadband
+
+            if significant:
+                signal.boosted_until = now + self.boost_hold
+                self._allocate(now)
+            elif signal.boosted_until and signal.boosted_until <= now:
+                signal.boosted_until = 0.0
+                self._allocate(now)
+
+            # never catch up with a burst of polls when we fell behind
+            signal.next_due = max(signal.next_due + 1.0 / signal.granted, now)
+
+            # removed while it was polled
+            if self._signals.get(name) is not signal:
+                return value
+
+        if changed:
+            for listener in list(self._listeners):
+                try:
+                    listener(name, old.value, value, timestamp)
+                except Exception as e:
+                    self._logger.exception('Listener of %s failed: %s', name, str(e))
+
+        reading = None if failed else signal.reading
+        for listener in list(self._poll_listeners):
+            try:
+                listener(name, reading, started)
+            except Exception as e:
+                self._logger.exception('Poll listener of %s failed: %s', name, str(e))
+
+        return value
@@ -0,0 +1,436 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# A local daemon, which owns the transport of one valve and serves the
+# driver API to client processes over a unix socket. Messages are JSON
+# objects, one per line:
+#
+#   request:  {"id": 1, "method": "get_pressure", "args": []}
+#   response: {"id": 1, "result": 1234}
+#             {"id": 1, "error": {"type": "ErrorResponse", "message": "E:000020"}}
+#
+# Exceptions within a result, e.g. of query_many(..., raise_errors=False),
+# are sent as {"error": {...}} entries as well.
+
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections import deque
+
+from e21_util.error import CommunicationError, ErrorResponse
+from e21_util.interface import Loggable
+
+from vat_590.driver import VAT590Driver
+from vat_590.decoders import Assembly, DeviceStatus, Warnings, ValveConfiguration
+from vat_590.singleflight import SingleFlight
+from vat_590.trajectory import TrajectoryReport
+
+# methods which are served. The configuration of the driver itself, e.g.
+# enable_trace or enable_write_behind, is left to the owner of the server.
+READS = frozenset([
+    'get_assembly', 'get_device_status', 'get_error_code', 'get_errors', 'get_firmware_configuration',
+    'get_firmware_number',
+    'get_identification', 'get_interface_configuration', 'get_pid_controller', 'get_position',
+    'get_position_range', 'get_pressure', 'get_pressure_range', 'get_range_configuration',
+    'get_sensor_configuration', 'get_sensor_offset', 'get_sensor_reading', 'get_speed', 'get_statistics',
+    'get_valve_configuration', 'get_warnings', 'query_many',
+])
+
+WRITES = frozenset([
+    'clear', 'close', 'hold', 'learn', 'open', 'refresh_configuration', 'reset', 'set_access',
+    'set_interface_configuration', 'set_pid_controller', 'set_position', 'set_pressure', 'set_pressure_alignment',
+    'set_range_configuration', 'set_sensor_configuration', 'set_speed', 'set_valve_configuration', 'zero',
+])
+
+# executed right away instead of queued behind the writes. A trajectory would
+# hold the write queue for its whole profile, e.g. an emergency close() of
+# another client must not wait for it, and stop_trajectory has to reach it.
+CONTROLS = frozenset([
+    'convert_from_range_configuration', 'convert_to_range_configuration', 'invalidate_configuration',
+    'run_trajectory', 'stop_trajectory',
+])
+
+METHODS = sorted(READS | WRITES | CONTROLS)
+
+# results which are sent as lists and turned into records again by the client
+RECORDS = {
+    'get_assembly': Assembly,
+    'get_device_status': DeviceStatus,
+    'get_warnings': Warnings,
+    'get_valve_configuration': ValveConfiguration,
+}
+
+ERRORS = {
+    'ErrorResponse': ErrorResponse,
+    'CommunicationError': CommunicationError,
+    'ValueError': ValueError,
+    'TypeError': TypeError,
+    'RuntimeError': RuntimeError,
+}
+
+
+def is_read(method):
+    return method in READS
+
+
+def encode_error(error):
+    return {'type': type(error).__name__, 'message': str(error)}
+
+
+def decode_error(error):
+    return ERRORS.get(error['type'], CommunicationError)(error['message'])
+
+
+def encode_result(result):
+    if isinstance(result, Exception):
+        return {'error': encode_error(result)}
+
+    # namedtuples and tuples are sent as lists
+    if isinstance(result, (list, tuple)):
+        return [encode_result(value) for value in result]
+
+    if isinstance(result, dict):
+        return dict((key, encode_result(value)) for key, value in result.items())
+
+    return result
+
+
+class FairScheduler(object):
+    """
+    Executes jobs one at a time, round robin over the clients which queued them.
+
+    Jobs of one client run in the order they were queued, a client queueing
+    many jobs can not starve the others.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._order = deque()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._run, name='VAT590Server writes')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def execute(self, client, function, *args):
+        """Queues the job for client and blocks until it was executed."""
+        job = [threading.Event(), None, None]
+
+        with self._condition:
+            if not self._running:
+                raise CommunicationError("Server is shutting down")
+
+            if client not in self._queues:
+                self._queues[client] = deque()
+                self._order.append(client)
+            self._queues[client].append((job, function, args))
+            self._condition.notify()
+
+        job[0].wait()
+        if job[2] is not None:
+            raise job[2]
+        return job[1]
+
+    def _next(self):
+        with self._condition:
+            while self._running and not self._order:
+                self._condition.wait()
+
+            if not self._running:
+                return None
+
+            client = self._order.popleft()
+            queue = self._queues[client]
+            entry = queue.popleft()
+
+            if queue:
+                self._order.append(client)
+            else:
+                del self._queues[client]
+
+            return entry
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                break
+
+            job, function, args = entry
+            try:
+                job[1] = function(*args)
+            except Exception as e:
+                job[2] = e
+            job[0].set()
+
+        # fail jobs which were not executed anymore
+        with self._condition:
+            for queue in self._queues.values():
+                for job, function, args in queue:
+                    job[2] = CommunicationError("Server is shutting down")
+                    job[0].set()
+            self._queues.clear()
+            self._order.clear()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.vat_server
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            response = {'id': None}
+            try:
+                request = json.loads(line.decode('utf-8'))
+                response['id'] = request.get('id')
+                response['result'] = encode_result(server.dispatch(self, request['method'], request.get('args', [])))
+                data = json.dumps(response)
+            except Exception as e:
+                # also results which can not be encoded
+                response.pop('result', None)
+                response['error'] = encode_error(e)
+                data = json.dumps(response)
+
+            try:
+                self.wfile.write((data + '\n').encode('utf-8'))
+                self.wfile.flush()
+            except (socket.error, IOError):
+                # the client gave up on the response, e.g. after a timeout
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class VAT590Server(Loggable):
+    """
+    Serves the VAT590Driver API to local processes over a unix socket.
+
+    The server is the only user of the transport. Identical reads which
+    arrive while one is in progress share its result, writes are executed
+    round robin between the clients.
+    """
+
+    def __init__(self, driver, path, logger):
+        super(VAT590Server, self).__init__(logger)
+        assert isinstance(driver, VAT590Driver)
+
+        self._driver = driver
+        self._path = path
+        self._reads = SingleFlight()
+        self._writes = FairScheduler()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def _bind(self):
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+        self._server = _UnixServer(self._path, _Handler)
+        self._server.vat_server = self
+        os.chmod(self._path, 0o600)
+        self._writes.start()
+
+    def serve_forever(self):
+        self._bind()
+        self._logger.info('Serving VAT 590 on %s', self._path)
+        self._server.serve_forever()
+
+    def start(self):
+        """Serves in a background thread."""
+        self._bind()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='VAT590Server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def shutdown(self):
+        if self._server is None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._writes.stop()
+        self._server = None
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def dispatch(self, client, method, args):
+        if method not in METHODS:
+            raise ValueError("Unknown method %s" % str(method))
+
+        function = getattr(self._driver, method)
+
+        if is_read(method):
+            key = (method, json.dumps(args))
+            return self._reads.do(key, function, *args)
+
+        if method in CONTROLS:
+            return function(*args)
+
+        return self._writes.execute(client, function, *args)
+
+
+class VAT590Client(object):
+    """
+    Proxy of a VAT590Driver served by a VAT590Server.
+
+    Offers the methods of VAT590Driver listed in METHODS. Calls from
+    several threads are sent one after the other over the one connection.
+    After an error or timeout the connection is opened again by the next
+    call, hence a late response can not be taken for the one of a later call.
+    """
+
+    def __init__(self, path, timeout=None):
+        self._path = path
+        self._timeout = timeout
+        self._socket = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._id = 0
+        self._connect()
+
+    def _connect(self):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(self._timeout)
+        try:
+            self._socket.connect(self._path)
+        except Exception:
+            self._socket.close()
+            self._socket = None
+            raise
+        self._file = self._socket.makefile('rwb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def disconnect(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def call(self, method, *args):
+        with self._lock:
+            self._id += 1
+            request = {'id': self._id, 'method': method, 'args': list(args)}
+
+            try:
+                if self._file is None:
+                    self._connect()
+                self._file.write((json.dumps(request) + '\n').encode('utf-8'))
+                self._file.flush()
+                response = self._receive(self._id)
+            except CommunicationError:
+                self.disconnect()
+                raise
+            except (socket.error, IOError, ValueError):
+                self.disconnect()
+                raise CommunicationError("Could not reach VAT 590 server")
+
+        if 'error' in response:
+            raise decode_error(response['error'])
+
+        return self._decode(method, args, response['result'])
+
+    def _receive(self, id):
+        while True:
+            line = self._file.readline()
+            if not line:
+                raise CommunicationError("VAT 590 server closed the connection")
+
+            response = json.loads(line.decode('utf-8'))
+            # responses of requests before an error are dropped
+            if response.get('id') == id:
+                return response
+
+    def _decode(self, method, args, result):
+        if method == 'query_many':
+            return self._decode_many(args[0], result)
+
+        if method == 'run_trajectory':
+            report = TrajectoryReport(*result)
+            reads = args[2] if len(args) > 2 else None
+            return report._replace(lateness=[tuple(entry) for entry in report.lateness],
+                                   readings=[(time, self._decode_many(reads, values))
+                                             for time, values in report.readings])
+
+        return self._decode_value(method, result)
+
+    def _decode_many(self, queries, results):
+        return [self._decode_value(query, value) for query, value in zip(queries, results)]
+
+    def _decode_value(self, method, value):
+        if isinstance(value, dict) and list(value.keys()) == ['error']:
+            return decode_error(value['error'])
+
+        if method in RECORDS and value is not None:
+            return RECORDS[method](*value)
+        return value
+
+
+def _proxy(method):
+    def call(self, *args):
+        return self.call(method, *args)
+
+    call.__name__ = method
+    return call
+
+
+for _method in METHODS:
+    setattr(VAT590Client, _method, _proxy(_method))
+
+for _name, _value in vars(VAT590Driver).items():
+    if _name.isupper():
+        setattr(VAT590Client, _name, _value)
@@ -0,0 +1,141 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+
+class VAT590SetpointWriter(object):
+    """
+    Writes position and pressure setpoints behind the back of the caller.
+
+    A setpoint equal to the last acknowledged one is dropped. Setpoints
+    submitted faster than max_rate replace each other, only the newest is
+    written. Position (R:) and pressure (S:) setpoints also select the
+    control mode, hence they share one slot and the newest of both wins.
+
+    send(name, data) writes the command of the driver and raises on errors,
+    also if the device rejected the setpoint.
+    """
+
+    def __init__(self, send, max_rate=50.0):
+        if max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+
+        self._send = send
+        self._interval = 1.0 / max_rate
+
+        self._condition = threading.Condition()
+        # serializes the writes of the background thread and flush
+        self._send_lock = threading.Lock()
+
+        self._pending = None
+        self._acknowledged = None
+        self._error = None
+        self._last_write = 0.0
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='VAT590SetpointWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, name, setpoint, data):
+        """Queues the setpoint of the command name, data is the encoded setpoint."""
+        with self._condition:
+            if self._pending is None and self._acknowledged == (name, setpoint):
+                return
+
+            self._pending = (name, setpoint, data)
+            self._condition.notify_all()
+
+    def get_acknowledged(self):
+        """Returns (name, setpoint) of the last setpoint the device acknowledged, or None."""
+        return self._acknowledged
+
+    def get_pending(self):
+        """Returns (name, setpoint) of the setpoint waiting to be written, or None."""
+        pending = self._pending
+        return None if pending is None else pending[0:2]
+
+    def invalidate(self):
+        """Forgets the acknowledged setpoint, e.g. after other commands changed the control mode."""
+        with self._condition:
+            self._acknowledged = None
+
+    def write_pending(self):
+        """Writes the pending setpoint now, an error is kept for the next flush."""
+        with self._send_lock:
+            with self._condition:
+                pending = self._pending
+                self._pending = None
+
+            if pending is None:
+                return
+
+            name, setpoint, data = pending
+            try:
+                self._send(name, data)
+            except Exception as e:
+                with self._condition:
+                    self._acknowledged = None
+                    self._error = e
+            else:
+                with self._condition:
+                    self._acknowledged = (name, setpoint)
+            finally:
+                self._last_write = time.monotonic()
+                with self._condition:
+                    self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._pending is None:
+                    self._condition.wait()
+
+                if not self._running:
+                    return
+
+                # newer setpoints submitted while waiting replace this one
+                delay = self._last_write + self._interval - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+            self.write_pending()
+
+    def flush(self):
+        """
+        Writes the pending setpoint now.
+
+        Raises the error of the last failed write, which is then cleared.
+        """
+        self.write_pending()
+
+        with self._condition:
+            error = self._error
+            self._error = None
+
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Flushes the pending setpoint and stops the background thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        self._thread.join()
+        self.flush()
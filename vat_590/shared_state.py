@@ -0,0 +1,275 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The latest state of a valve in a shared memory segment, written by one
+# publisher process and read lock free by any number of other processes.
+#
+# Layout, little endian:
+#
+#   magic 'VAT590S1', sequence (uint64), timestamp (float64),
+#   polls (uint64), failures (uint32), assembly (i:76), device status (i:30)
+#   and warnings (i:51) as fixed width payloads, the code of errors (i:50,
+#   pascal string)
+#
+# The sequence is odd while the publisher writes. Readers copy the segment
+# and retry if the sequence was odd or changed meanwhile (a seqlock).
+
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from e21_util.interface import Loggable
+
+from vat_590.constants import DEVICE_ERROR
+from vat_590.decoders import ASSEMBLY, DEVICE_STATUS, WARNINGS
+from vat_590.driver import VAT590Driver
+
+MAGIC = b'VAT590S1'
+SEQUENCE = struct.Struct('<Q')
+SEQUENCE_OFFSET = len(MAGIC)
+BODY = struct.Struct('<dQI%ds%ds%ds64p' % (ASSEMBLY.length, DEVICE_STATUS.length, WARNINGS.length))
+BODY_OFFSET = SEQUENCE_OFFSET + SEQUENCE.size
+SIZE = BODY_OFFSET + BODY.size
+
+# errors are read undecoded, an unknown code must not fail the whole poll
+QUERIES = ['get_assembly', 'get_device_status', 'get_warnings', 'get_error_code']
+
+ERROR_DESCRIPTIONS = dict((code, description) for description, code in DEVICE_ERROR.items())
+
+# timestamp of the last successful poll, polls since the start of the
+# publisher and failed polls since the last successful one. errors is the
+# DEVICE_ERROR description of error_code, or the code if it is unknown.
+State = namedtuple('State', [
+    'sequence', 'timestamp', 'polls', 'failures', 'assembly', 'device_status', 'warnings', 'errors', 'error_code'
+])
+
+# names of the segments created by publishers of this process
+_published = set()
+
+
+class VAT590StatePublisher(Loggable):
+    """
+    Polls assembly, device status, warnings and errors and publishes them in shared memory.
+
+    The four registers are read in one pipelined round trip per poll. The
+    segment is created with the given name, or a random one, see name.
+    Requires Python 3.8 (multiprocessing.shared_memory).
+    """
+
+    def __init__(self, driver, logger, name=None, rate=10.0):
+        super(VAT590StatePublisher, self).__init__(logger)
+        assert isinstance(driver, VAT590Driver)
+
+        from multiprocessing.shared_memory import SharedMemory
+
+        if rate <= 0:
+            raise ValueError("rate must be positive, given: %s" % str(rate))
+
+        self._driver = driver
+        self._interval = 1.0 / rate
+
+        self._memory = SharedMemory(name=name, create=True, size=SIZE)
+        self._name = self._memory.name
+        _published.add(self._name)
+        self._buffer = self._memory.buf
+        self._buffer[0:len(MAGIC)] = MAGIC
+
+        self._sequence = 0
+        self._polls = 0
+        self._failures = 0
+        self._values = (0.0, b'0' * ASSEMBLY.length, b'0' * DEVICE_STATUS.length, b'0' * WARNINGS.length, b'')
+        self._publish()
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def name(self):
+        """The name of the segment, which readers attach to."""
+        return self._name
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='VAT590StatePublisher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self):
+        """Stops polling and removes the segment."""
+        self.stop()
+
+        if self._memory is None:
+            return
+
+        self._buffer.release()
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+        _published.discard(self._name)
+
+    def _run(self):
+        deadline = time.monotonic()
+
+        while not self._stop.is_set():
+            self.poll()
+
+            deadline += self._interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                deadline = time.monotonic()
+                delay = 0
+
+            self._stop.wait(delay)
+
+    def poll(self):
+        """Polls the registers once and publishes them."""
+        self._polls += 1
+
+        try:
+            assembly, device_status, warnings, error_code = self._driver.query_many(QUERIES)
+        except Exception as e:
+            self._logger.warning('Could not poll the state: %s', str(e))
+            self._failures += 1
+            self._publish()
+            return False
+
+        self._failures = 0
+        self._values = (time.time(),
+                        ASSEMBLY.encode_payload(assembly).encode('ascii'),
+                        DEVICE_STATUS.encode_payload(device_status).encode('ascii'),
+                        WARNINGS.encode_payload(warnings).encode('ascii'),
+                        str(error_code).encode('ascii', 'replace')[:63])
+        self._publish()
+        return True
+
+    def _publish(self):
+        timestamp, assembly, device_status, warnings, errors = self._values
+        buffer = self._buffer
+
+        self._sequence += 1
+        SEQUENCE.pack_into(buffer, SEQUENCE_OFFSET, self._sequence)
+        BODY.pack_into(buffer, BODY_OFFSET, timestamp, self._polls, self._failures,
+                       assembly, device_status, warnings, errors)
+        self._sequence += 1
+        SEQUENCE.pack_into(buffer, SEQUENCE_OFFSET, self._sequence)
+
+
+def _attach(name):
+    from multiprocessing.shared_memory import SharedMemory
+
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # before Python 3.13 every process which attaches registers the segment
+    # at the resource tracker, which removes it when the process exits. The
+    # publisher of this process keeps its registration, it unlinks anyway.
+    memory = SharedMemory(name=name)
+    if memory.name not in _published:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(memory._name, 'shared_memory')
+
+    return memory
+
+
+class VAT590StateReader(object):
+    """
+    Reads the state published by a VAT590StatePublisher, by the name of its segment.
+
+    Reads neither lock nor touch the serial line. A state with timestamp 0
+    was not polled yet. While the publisher writes, a read waits up to
+    timeout seconds for it.
+    """
+
+    def __init__(self, name, timeout=1.0):
+        self._memory = _attach(name)
+        self._buffer = self._memory.buf
+        self.timeout = timeout
+
+        if bytes(self._buffer[0:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError("%s is not a VAT 590 state segment" % name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._memory is None:
+            return
+
+        self._buffer.release()
+        self._memory.close()
+        self._memory = None
+
+    def read_raw(self):
+        """Returns (sequence, body) of a consistent copy, see BODY."""
+        buffer = self._buffer
+        deadline = None
+
+        while True:
+            sequence = SEQUENCE.unpack_from(buffer, SEQUENCE_OFFSET)[0]
+            if not sequence & 1:
+                body = BODY.unpack_from(buffer, BODY_OFFSET)
+                if SEQUENCE.unpack_from(buffer, SEQUENCE_OFFSET)[0] == sequence:
+                    return sequence, body
+
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.timeout
+            elif now > deadline:
+                raise RuntimeError("Could not read a consistent state, is the publisher stuck?")
+
+            # the publisher may be preempted in the middle of a write, let it finish
+            time.sleep(0)
+
+    def read(self):
+        """Returns the latest State."""
+        sequence, (timestamp, polls, failures, assembly, device_status, warnings, error_code) = self.read_raw()
+
+        if timestamp == 0:
+            return State(sequence, timestamp, polls, failures, None, None, None, None, None)
+
+        error_code = error_code.decode('ascii')
+        return State(sequence, timestamp, polls, failures,
+                     ASSEMBLY.decode_payload(assembly.decode('ascii')),
+                     DEVICE_STATUS.decode_payload(device_status.decode('ascii')),
+                     WARNINGS.decode_payload(warnings.decode('ascii')),
+                     ERROR_DESCRIPTIONS.get(error_code, error_code),
+                     error_code)
+
+    def get_sequence(self):
+        """Returns the sequence, which changes with every publish."""
+        return SEQUENCE.unpack_from(self._buffer, SEQUENCE_OFFSET)[0]
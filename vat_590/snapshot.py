@@ -0,0 +1,189 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Configuration snapshots of valves, to commission or replace a valve.
+#
+# A snapshot is a JSON compatible dict:
+#
+#   {
+#     "format": "vat590-configuration/1",
+#     "identification": "...", "firmware_number": "...", "firmware_configuration": "...",
+#     "registers": {
+#       "sensor_configuration": ["1", "1", "000000"],               (i:01)
+#       "pid_controller": "...",                                     (i:02)
+#       "valve_configuration": {"valve_power_up": "close", ...},     (i:04)
+#       "range_configuration": {"position_range": "2", ...},         (i:21)
+#       "interface_configuration": {"baud_rate": "9600", ...}        (i:20)
+#     }
+#   }
+#
+# Coded fields hold their meaning of constants.py. A snapshot is read in one
+# pipelined round trip, a restore writes only the registers which differ.
+
+from collections import OrderedDict
+
+from vat_590.decoders import ValveConfiguration
+from vat_590.driver import VAT590Driver
+from vat_590.pool import VAT590Pool
+
+FORMAT = 'vat590-configuration/1'
+
+INTERFACE_FIELDS = ('baud_rate', 'parity', 'data_length', 'stop_bits', 'reserved', 'digital_input_open',
+                    'digital_input_closed', 'reserved_2')
+
+RANGE_FIELDS = ('position_range', 'pressure_range')
+
+# configuration registers in the order they are restored, with their
+# getter and the names of their fields (None to store the value as is)
+REGISTERS = OrderedDict([
+    ('sensor_configuration', ('get_sensor_configuration', None)),
+    ('pid_controller', ('get_pid_controller', None)),
+    ('valve_configuration', ('get_valve_configuration', ValveConfiguration._fields)),
+    ('range_configuration', ('get_range_configuration', RANGE_FIELDS)),
+    # last, since a new baud rate requires to reconfigure the transport
+    ('interface_configuration', ('get_interface_configuration', INTERFACE_FIELDS)),
+])
+
+# registers restored by default, the interface configuration is left alone
+RESTORED = ('sensor_configuration', 'pid_controller', 'valve_configuration', 'range_configuration')
+
+INFORMATION = OrderedDict([
+    ('identification', 'get_identification'),
+    ('firmware_number', 'get_firmware_number'),
+    ('firmware_configuration', 'get_firmware_configuration'),
+])
+
+
+def _encode(value, fields):
+    if fields is not None:
+        return OrderedDict(zip(fields, value))
+
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return value
+
+
+def _decode(value, fields):
+    if fields is not None:
+        return [value[field] for field in fields]
+
+    return value
+
+
+def _write(driver, name, value):
+    if name == 'range_configuration':
+        position_range, pressure_range = value
+        driver.set_range_configuration(position_range, int(pressure_range))
+    elif name == 'sensor_configuration':
+        driver.set_sensor_configuration(value)
+    elif name == 'pid_controller':
+        driver.set_pid_controller(value)
+    elif name == 'valve_configuration':
+        driver.set_valve_configuration(value)
+    elif name == 'interface_configuration':
+        driver.set_interface_configuration(value)
+
+
+def _read_registers(driver, names):
+    values = driver.query_many([REGISTERS[name][0] for name in names])
+    return OrderedDict((name, _encode(value, REGISTERS[name][1])) for name, value in zip(names, values))
+
+
+def take_snapshot(driver):
+    """Reads all configuration registers of the valve in one round trip and returns the snapshot."""
+    assert isinstance(driver, VAT590Driver)
+
+    names = list(REGISTERS.keys())
+    values = driver.query_many(list(INFORMATION.values()) + [REGISTERS[name][0] for name in names])
+
+    snapshot = OrderedDict([('format', FORMAT)])
+    for key, value in zip(INFORMATION.keys(), values):
+        snapshot[key] = value
+
+    snapshot['registers'] = OrderedDict((name, _encode(value, REGISTERS[name][1]))
+                                        for name, value in zip(names, values[len(INFORMATION):]))
+    return snapshot
+
+
+def _registers(snapshot, registers):
+    if snapshot.get('format') != FORMAT:
+        raise ValueError("Not a snapshot of format %s" % FORMAT)
+
+    if registers is None:
+        registers = RESTORED
+
+    for name in registers:
+        if name not in REGISTERS:
+            raise ValueError("Unknown configuration register %s, see REGISTERS" % str(name))
+
+    # restore in the order of REGISTERS
+    return [name for name in REGISTERS if name in registers and name in snapshot['registers']]
+
+
+def diff_snapshot(driver, snapshot, registers=None):
+    """
+    Returns the registers of the valve which differ from the snapshot.
+
+    The result maps the register name to (current value, value of the
+    snapshot). registers defaults to RESTORED.
+    """
+    names = _registers(snapshot, registers)
+    current = _read_registers(driver, names)
+
+    return OrderedDict((name, (current[name], snapshot['registers'][name]))
+                       for name in names if current[name] != _encode(snapshot['registers'][name], None))
+
+
+def restore_snapshot(driver, snapshot, registers=None, verify=True):
+    """
+    Writes the registers which differ from the snapshot and returns their names.
+
+    registers defaults to RESTORED. Restoring the interface_configuration
+    with another baud rate requires to reconfigure the transport afterwards.
+    With verify, the written registers are read back and a ValueError is
+    raised if the valve did not take them.
+    """
+    differences = diff_snapshot(driver, snapshot, registers)
+
+    for name, (current, wanted) in differences.items():
+        _write(driver, name, _decode(wanted, REGISTERS[name][1]))
+
+    written = list(differences.keys())
+    if verify and written and 'interface_configuration' not in written:
+        for name, value in _read_registers(driver, written).items():
+            if value != _encode(snapshot['registers'][name], None):
+                raise ValueError("%s was not restored, read %s" % (name, str(value)))
+
+    return written
+
+
+def snapshot_fleet(pool):
+    """Takes the snapshot of all valves of the VAT590Pool, returns PoolResults by valve name."""
+    assert isinstance(pool, VAT590Pool)
+    return pool.apply(take_snapshot)
+
+
+def restore_fleet(pool, snapshots, registers=None, verify=True):
+    """
+    Restores the snapshots, by valve name, on the valves of the VAT590Pool.
+
+    Valves on different ports are restored in parallel. Returns PoolResults
+    by valve name with the names of the written registers.
+    """
+    assert isinstance(pool, VAT590Pool)
+
+    arguments = dict((name, (snapshot, registers, verify)) for name, snapshot in snapshots.items())
+    return pool.apply(restore_snapshot, list(snapshots.keys()), arguments)
@@ -0,0 +1,172 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import threading
+
+from vat_590.constants import ERROR_INDEX
+
+# upper bounds of the histogram buckets in seconds, 10us up to ~84s
+BUCKETS = tuple(1e-5 * 2 ** i for i in range(24))
+
+ERROR_CODES = dict((code.rstrip(':'), name) for name, code in ERROR_INDEX.items())
+
+# ERROR_INDEX uses these descriptions twice, hence only the later code survived in the dict
+ERROR_CODES.setdefault('E:000020', 'Unknown command')
+ERROR_CODES.setdefault('E:000022', 'Invalid value')
+
+
+def classify_error(response):
+    """Returns the ERROR_INDEX description of an E: response, or its code if unknown."""
+    if isinstance(response, bytes):
+        response = response.decode('ascii', 'replace')
+
+    code = response[:8]
+    return ERROR_CODES.get(code, code)
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Returns the upper bucket bound below which the fraction q of the samples lie."""
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': [(bound, count) for bound, count in zip(BUCKETS + (float('inf'),), self.counts) if count],
+        }
+
+
+class _CommandStatistics(object):
+    def __init__(self):
+        self.total = LatencyHistogram()
+        self.lock_wait = LatencyHistogram()
+        self.write = LatencyHistogram()
+        self.read = LatencyHistogram()
+        self.failures = 0
+        self.resyncs = 0
+
+    def snapshot(self):
+        return {
+            'total': self.total.snapshot(),
+            'lock_wait': self.lock_wait.snapshot(),
+            'write': self.write.snapshot(),
+            'read': self.read.snapshot(),
+            'failures': self.failures,
+            'resyncs': self.resyncs,
+        }
+
+
+class ProtocolStatistics(object):
+    """
+    Latency and error statistics of a VAT590Protocol, by command header.
+
+    Round trips are split into the wait for the transport lock, writing the
+    frame and reading the response. E: responses are counted by their
+    ERROR_INDEX description. Requests pipelined by query_many are recorded
+    by their own header, with the lock wait and write of the whole batch
+    and the time since the previous response as read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._commands = {}
+            self._errors = {}
+            self._bytes_sent = 0
+            self._bytes_received = 0
+
+    def record(self, header, lock_wait, write, read, sent, received):
+        with self._lock:
+            command = self._command(header)
+            command.total.add(lock_wait + write + read)
+            command.lock_wait.add(lock_wait)
+            command.write.add(write)
+            command.read.add(read)
+
+            self._bytes_sent += sent
+            self._bytes_received += received
+
+    def _command(self, header):
+        command = self._commands.get(header)
+        if command is None:
+            command = self._commands[header] = _CommandStatistics()
+        return command
+
+    def record_failure(self, header):
+        with self._lock:
+            self._command(header).failures += 1
+
+    def record_resync(self, header):
+        """Counts a frame of header which was dropped or retried to regain the frame boundary."""
+        with self._lock:
+            self._command(header).resyncs += 1
+
+    def record_error(self, header, response):
+        error = classify_error(response)
+        with self._lock:
+            errors = self._errors.setdefault(header, {})
+            errors[error] = errors.get(error, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            error_totals = {}
+            for errors in self._errors.values():
+                for error, count in errors.items():
+                    error_totals[error] = error_totals.get(error, 0) + count
+
+            return {
+                'commands': dict((header, command.snapshot()) for header, command in self._commands.items()),
+                'errors': dict((header, dict(errors)) for header, errors in self._errors.items()),
+                'error_totals': error_totals,
+                'bytes_sent': self._bytes_sent,
+                'bytes_received': self._bytes_received,
+            }
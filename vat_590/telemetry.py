@@ -0,0 +1,255 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Columnar telemetry files of assembly (i:76) samples.
+#
+# The file starts with a 64 byte header, followed by one block per column of
+# `capacity` fixed width values each:
+#
+#   header:  magic 'VAT590T1', version, column count, capacity, count
+#   columns: timestamp (float64), position (int32), pressure (int32, signed),
+#            operation_mode, status, warning (uint8, the ASCII code of the
+#            value in OPERATION_MODE, STATUS and WARNING of constants.py)
+#
+# All values are little endian. When the file is full its capacity is
+# doubled and the columns are moved to their new offsets.
+
+import mmap
+import os
+import struct
+import time
+
+from vat_590.constants import OPERATION_MODE, STATUS, WARNING
+
+MAGIC = b'VAT590T1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+HEADER_SIZE = 64
+
+# name, struct format and numpy dtype of the columns, in file order
+COLUMNS = (
+    ('timestamp', '<d', '<f8'),
+    ('position', '<i', '<i4'),
+    ('pressure', '<i', '<i4'),
+    ('operation_mode', '<B', 'u1'),
+    ('status', '<B', 'u1'),
+    ('warning', '<B', 'u1'),
+)
+
+CODED_COLUMNS = {
+    'operation_mode': OPERATION_MODE,
+    'status': STATUS,
+    'warning': WARNING,
+}
+
+
+def _codes(table):
+    return dict((name, ord(code)) for name, code in table.items())
+
+
+def decode_codes(codes, table):
+    """Maps an array or sequence of coded bytes back to the names of a constants.py table."""
+    names = dict((ord(code), name) for name, code in table.items())
+    return [names.get(int(code)) for code in codes]
+
+
+def _offsets(capacity):
+    offsets = []
+    offset = HEADER_SIZE
+    for name, fmt, dtype in COLUMNS:
+        offsets.append(offset)
+        offset += capacity * struct.calcsize(fmt)
+    return offsets, offset
+
+
+class VAT590TelemetryRecorder(object):
+    """
+    Appends assembly samples to a memory mapped columnar telemetry file.
+
+    Samples are written with precompiled structs directly into the mapping,
+    such that recording does not allocate buffers per sample.
+    """
+
+    def __init__(self, path, capacity=1 << 20):
+        self._path = path
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as f:
+                f.truncate(_offsets(capacity)[1])
+                f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), capacity, 0))
+
+        self._file = open(path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+
+        magic, version, columns, capacity, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or columns != len(COLUMNS):
+            raise ValueError("%s is not a VAT 590 telemetry file of version %d" % (path, VERSION))
+
+        self._capacity = capacity
+        self._count = count
+        self._structs = [struct.Struct(fmt) for name, fmt, dtype in COLUMNS]
+        self._count_struct = struct.Struct('<Q')
+        self._layout()
+
+        self._operation_modes = _codes(OPERATION_MODE)
+        self._status = _codes(STATUS)
+        self._warnings = _codes(WARNING)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _layout(self):
+        offsets = _offsets(self._capacity)[0]
+        self._columns = [(s, offset, s.size) for s, offset in zip(self._structs, offsets)]
+
+    def _grow(self):
+        old_offsets = _offsets(self._capacity)[0]
+        capacity = self._capacity * 2
+        new_offsets, size = _offsets(capacity)
+
+        self._mmap.close()
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+
+        # move the last column first, every column moves towards the end of the file
+        for (name, fmt, dtype), old, new in reversed(list(zip(COLUMNS, old_offsets, new_offsets))):
+            self._mmap.move(new, old, self._count * struct.calcsize(fmt))
+
+        self._capacity = capacity
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, len(COLUMNS), capacity, self._count)
+        self._layout()
+
+    def record_values(self, timestamp, position, pressure, operation_mode, status, warning):
+        """Appends one sample, the last three given as coded bytes, see CODED_COLUMNS."""
+        if self._count == self._capacity:
+            self._grow()
+
+        index = self._count
+        buffer = self._mmap
+        columns = self._columns
+
+        s, offset, size = columns[0]
+        s.pack_into(buffer, offset + index * size, timestamp)
+        s, offset, size = columns[1]
+        s.pack_into(buffer, offset + index * size, position)
+        s, offset, size = columns[2]
+        s.pack_into(buffer, offset + index * size, pressure)
+        s, offset, size = columns[3]
+        s.pack_into(buffer, offset + index * size, operation_mode)
+        s, offset, size = columns[4]
+        s.pack_into(buffer, offset + index * size, status)
+        s, offset, size = columns[5]
+        s.pack_into(buffer, offset + index * size, warning)
+
+        # the count is written last, so readers never see a partial sample
+        self._count = index + 1
+        self._count_struct.pack_into(buffer, HEADER.size - 8, self._count)
+
+    def record(self, assembly, timestamp=None):
+        """Appends the result of VAT590Driver.get_assembly."""
+        if timestamp is None:
+            timestamp = time.time()
+
+        position, sign, pressure, operation_mode, status, warning = assembly
+
+        pressure = int(pressure)
+        if sign == 'Negative':
+            pressure = -pressure
+
+        self.record_values(timestamp, int(position), pressure, self._operation_modes[operation_mode],
+                           self._status[status], self._warnings[warning])
+
+    def record_sample(self, sample):
+        """Appends a VAT590Sample of the VAT590Poller."""
+        self.record_values(sample.timestamp, sample.position, sample.pressure,
+                           self._operation_modes[sample.operation_mode], self._status[sample.status],
+                           self._warnings[sample.warning])
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        if self._mmap is None:
+            return
+
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+
+
+class VAT590TelemetryReader(object):
+    """
+    Reads a telemetry file as NumPy arrays, requires numpy.
+
+    The columns are memory mapped, hence only the pages of the requested
+    time window are loaded. Samples are expected in time order, as written
+    by the VAT590TelemetryRecorder.
+    """
+
+    def __init__(self, path):
+        import numpy
+
+        self._numpy = numpy
+        self._path = path
+        self._capacity = None
+        self.refresh()
+
+    def __len__(self):
+        return self._count
+
+    def refresh(self):
+        """Picks up samples recorded since the file was opened."""
+        with open(self._path, 'rb') as f:
+            magic, version, columns, capacity, count = HEADER.unpack(f.read(HEADER.size))
+
+        if magic != MAGIC or version != VERSION or columns != len(COLUMNS):
+            raise ValueError("%s is not a VAT 590 telemetry file of version %d" % (self._path, VERSION))
+
+        if capacity != self._capacity:
+            offsets = _offsets(capacity)[0]
+            self._columns = dict(
+                (name, self._numpy.memmap(self._path, dtype=dtype, mode='r', offset=offset, shape=(capacity,)))
+                for (name, fmt, dtype), offset in zip(COLUMNS, offsets))
+            self._capacity = capacity
+
+        self._count = count
+
+    def column(self, name):
+        """Returns all samples of the column as read only array."""
+        return self._columns[name][:self._count]
+
+    def window(self, start=None, end=None):
+        """
+        Returns the samples with start <= timestamp < end, as dict of arrays by column name.
+
+        start and end are unix timestamps, None means unbounded.
+        """
+        timestamps = self.column('timestamp')
+
+        first = 0 if start is None else int(self._numpy.searchsorted(timestamps, start, 'left'))
+        last = self._count if end is None else int(self._numpy.searchsorted(timestamps, end, 'left'))
+
+        return dict((name, column[first:last]) for name, column in self._columns.items())
+
+    def decode(self, name, codes):
+        """Maps coded bytes of operation_mode, status or warning to their names."""
+        return decode_codes(codes, CODED_COLUMNS[name])
@@ -0,0 +1,148 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Trace files, little endian:
+#
+#   magic 'VAT590P1', offset of the wall clock to the monotonic clock
+#   (float64), length of the reason (uint16), reason (utf-8), frames as
+#   monotonic timestamp (float64), direction (uint8), length (uint16) and
+#   the data. Received frames are stored without \r\n, sent data as written,
+#   i.e. pipelined frames in one record.
+
+import collections
+import datetime
+import os
+import struct
+import threading
+import time
+
+# distinct from the telemetry files
+MAGIC = b'VAT590P1'
+HEADER = struct.Struct('<dH')
+RECORD = struct.Struct('<dBH')
+
+SENT = 0
+RECEIVED = 1
+
+# timestamp is wall clock time
+Frame = collections.namedtuple('Frame', ['timestamp', 'direction', 'data'])
+
+
+class ProtocolTrace(object):
+    """
+    Keeps the last size frames sent and received in memory.
+
+    Recording a frame costs one timestamp and one append, hence the trace
+    can stay enabled while polling. If directory is given, the trace is
+    dumped there when a frame could not be sent or read, or an E: response
+    arrived, at most once per min_interval seconds.
+    """
+
+    def __init__(self, size=4096, directory=None, min_interval=10.0):
+        if size <= 0:
+            raise ValueError("size must be positive, given: %s" % str(size))
+
+        self._frames = collections.deque(maxlen=size)
+        self.directory = directory
+        self.min_interval = min_interval
+
+        self._lock = threading.Lock()
+        self._last_dump = None
+        # path of the latest automatic dump
+        self.last_path = None
+
+    @property
+    def size(self):
+        return self._frames.maxlen
+
+    def sent(self, frame):
+        self._frames.append((time.monotonic(), SENT, frame))
+
+    def received(self, frame):
+        self._frames.append((time.monotonic(), RECEIVED, frame))
+
+    def clear(self):
+        self._frames.clear()
+
+    def get_frames(self):
+        """Returns the recorded frames as Frame, oldest first."""
+        offset = time.time() - time.monotonic()
+        return [Frame(timestamp + offset, direction, data) for timestamp, direction, data in list(self._frames)]
+
+    def dump(self, path, reason=''):
+        """Writes the recorded frames to path, read them with read_trace."""
+        frames = list(self._frames)
+        reason = reason.encode('utf-8')[:0xffff]
+
+        parts = [MAGIC, HEADER.pack(time.time() - time.monotonic(), len(reason)), reason]
+        for timestamp, direction, data in frames:
+            data = data[:0xffff]
+            parts.append(RECORD.pack(timestamp, direction, len(data)))
+            parts.append(data)
+
+        with open(path, 'wb') as f:
+            f.write(b''.join(parts))
+
+        return len(frames)
+
+    def failed(self, reason):
+        """Dumps the trace into directory, unless the last dump was less than min_interval ago."""
+        if self.directory is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            if self._last_dump is not None and now - self._last_dump < self.min_interval:
+                return None
+            self._last_dump = now
+
+        path = os.path.join(self.directory, datetime.datetime.now().strftime('vat590-trace-%Y%m%d-%H%M%S-%f.bin'))
+        self.dump(path, reason)
+        self.last_path = path
+        return path
+
+
+def read_trace(path):
+    """Returns (reason, frames) of a trace file, see ProtocolTrace.dump."""
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    if content[:len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a VAT 590 trace" % path)
+
+    index = len(MAGIC)
+    offset, length = HEADER.unpack_from(content, index)
+    index += HEADER.size
+    reason = content[index:index + length].decode('utf-8')
+    index += length
+
+    frames = []
+    while index < len(content):
+        timestamp, direction, length = RECORD.unpack_from(content, index)
+        index += RECORD.size
+        frames.append(Frame(timestamp + offset, direction, content[index:index + length]))
+        index += length
+
+    return reason, frames
+
+
+def format_trace(frames):
+    """Returns the frames as lines of text, with the time relative to the first frame."""
+    if not frames:
+        return ''
+
+    start = frames[0].timestamp
+    return '\n'.join('%10.6f %s %r' % (frame.timestamp - start, '>' if frame.direction == SENT else '<', frame.data)
+                     for frame in frames)
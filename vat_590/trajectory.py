@@ -0,0 +1,136 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import namedtuple
+
+# time in seconds after the start of the trajectory
+Point = namedtuple('Point', ['time', 'setpoint'])
+
+# lateness holds (time, setpoint, seconds the write started after its
+# deadline) for every written point, readings holds (time, values)
+TrajectoryReport = namedtuple('TrajectoryReport', [
+    'points', 'written', 'skipped', 'mean_lateness', 'max_lateness', 'lateness', 'readings', 'read_failures',
+    'duration', 'stopped'
+])
+
+
+def ramp(start, end, duration, interval):
+    """Returns the Points of a linear ramp from start to end, one every interval seconds."""
+    if duration < 0 or interval <= 0:
+        raise ValueError("duration must not be negative and interval must be positive")
+
+    steps = max(1, int(round(duration / float(interval))))
+    return [Point(duration * i / float(steps), int(round(start + (end - start) * i / float(steps))))
+            for i in range(steps + 1)]
+
+
+class VAT590TrajectoryStreamer(object):
+    """
+    Writes the setpoints of a profile on absolute deadlines.
+
+    A point is written at start + point.time, hence delays do not add up.
+    If a point is due while the next one is already due as well, e.g. after
+    another thread held the transport, it is skipped. The time between two
+    writes is used for read(), at most every read_interval seconds and only
+    if the previous reads suggest it ends before the next deadline.
+    """
+
+    def __init__(self, write, read=None, read_interval=0.0, clock=time.monotonic):
+        self._write = write
+        self._read = read
+        self.read_interval = read_interval
+        self._clock = clock
+
+        self._stop = threading.Event()
+        # duration of the last read
+        self._read_time = 0.0
+
+    def stop(self):
+        """Ends a running trajectory before its next point."""
+        self._stop.set()
+
+    def run(self, profile, delay=0.0):
+        """
+        Streams the profile, a list of Point or (time, setpoint), and returns a TrajectoryReport.
+
+        The first point is due delay seconds after the call. Errors of
+        write() abort the trajectory, errors of read() are counted.
+        """
+        points = [Point(*point) for point in profile]
+        for previous, point in zip(points, points[1:]):
+            if point.time < previous.time:
+                raise ValueError("Points must be ordered by time, %s before %s" % (str(previous), str(point)))
+        if points and points[0].time < 0:
+            raise ValueError("Point times must not be negative")
+
+        self._stop.clear()
+        clock = self._clock
+        start = clock() + delay
+        last_read = None
+
+        lateness = []
+        readings = []
+        skipped = 0
+        read_failures = 0
+
+        for index, point in enumerate(points):
+            deadline = start + point.time
+            now = clock()
+            if now < deadline and self._stop.wait(deadline - now):
+                break
+            if self._stop.is_set():
+                break
+
+            now = clock()
+            if index + 1 < len(points) and start + points[index + 1].time <= now:
+                skipped += 1
+                continue
+
+            self._write(point.setpoint)
+            lateness.append((now - start, point.setpoint, now - deadline))
+
+            if self._read is None or index + 1 == len(points):
+                continue
+
+            now = clock()
+            if last_read is not None and now - last_read < self.read_interval:
+                continue
+            if now + self._read_time > start + points[index + 1].time:
+                continue
+
+            last_read = now
+            try:
+                values = self._read()
+            except Exception:
+                read_failures += 1
+            else:
+                readings.append((now - start, values))
+            self._read_time = clock() - now
+
+        delays = [late for _, _, late in lateness]
+        return TrajectoryReport(
+            points=len(points),
+            written=len(lateness),
+            skipped=skipped,
+            mean_lateness=sum(delays) / len(delays) if delays else 0.0,
+            max_lateness=max(delays) if delays else 0.0,
+            lateness=lateness,
+            readings=readings,
+            read_failures=read_failures,
+            duration=clock() - start,
+            stopped=self._stop.is_set()
+        )
@@ -0,0 +1,105 @@
+# Copyright (C) 2016, see AUTHORS.md
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from vat_590.driver import VAT590Driver
+
+POSITION_RANGES = {
+    VAT590Driver.RANGE_POSITION_1000: 1000,
+    VAT590Driver.RANGE_POSITION_10000: 10000,
+    VAT590Driver.RANGE_POSITION_100000: 100000,
+}
+
+
+def _is_array(value):
+    return hasattr(value, '__array__') or isinstance(value, (list, tuple))
+
+
+class VAT590UnitConverter(object):
+    """
+    Converts raw position and pressure counts to physical units and back.
+
+    Positions are scaled to percent open by the position range, pressures to
+    the sensor full scale by the pressure range of the range configuration
+    (i:21). The full scale is given in the unit the pressures should be
+    reported in, e.g. 1.0 mbar for a 1 mbar gauge. Every conversion accepts a
+    scalar or a NumPy array (or sequence) of values, arrays are converted in
+    one vectorized operation.
+    """
+
+    def __init__(self, position_range, pressure_range, full_scale=1.0):
+        if position_range <= 0 or pressure_range <= 0:
+            raise ValueError("ranges must be positive")
+
+        self.position_range = position_range
+        self.pressure_range = pressure_range
+        self.full_scale = float(full_scale)
+
+        self._percent_per_count = 100.0 / position_range
+        self._counts_per_percent = position_range / 100.0
+        self._unit_per_count = self.full_scale / pressure_range
+        self._counts_per_unit = pressure_range / self.full_scale
+
+    @classmethod
+    def from_range_configuration(cls, range_configuration, full_scale=1.0):
+        """Creates the converter from the result of VAT590Driver.get_range_configuration."""
+        position_code, pressure_range = range_configuration
+        if position_code not in POSITION_RANGES:
+            raise ValueError("given range is not supported")
+
+        return cls(POSITION_RANGES[position_code], int(pressure_range), full_scale)
+
+    @classmethod
+    def from_driver(cls, driver, full_scale=1.0):
+        """Creates the converter from the range configuration of the valve."""
+        assert isinstance(driver, VAT590Driver)
+        return cls.from_range_configuration(driver.get_range_configuration(), full_scale)
+
+    def _scale(self, value, factor):
+        if _is_array(value):
+            import numpy
+            return numpy.asarray(value, dtype=numpy.float64) * factor
+
+        return value * factor
+
+    def _to_counts(self, value, factor, limit):
+        if _is_array(value):
+            import numpy
+            counts = numpy.rint(numpy.asarray(value, dtype=numpy.float64) * factor)
+            return numpy.clip(counts, 0, limit).astype(numpy.int64)
+
+        return min(max(int(round(value * factor)), 0), limit)
+
+    def position_to_percent(self, counts):
+        return self._scale(counts, self._percent_per_count)
+
+    def percent_to_position(self, percent):
+        """Returns the setpoint for set_position, clipped to the position range."""
+        return self._to_counts(percent, self._counts_per_percent, self.position_range)
+
+    def pressure_to_physical(self, counts):
+        return self._scale(counts, self._unit_per_count)
+
+    def physical_to_pressure(self, pressure):
+        """Returns the setpoint for set_pressure, clipped to the pressure range."""
+        return self._to_counts(pressure, self._counts_per_unit, self.pressure_range)
+
+    def convert_window(self, window):
+        """
+        Adds position_percent and pressure_physical to a window of the VAT590TelemetryReader.
+        """
+        window = dict(window)
+        window['position_percent'] = self.position_to_percent(window['position'])
+        window['pressure_physical'] = self.pressure_to_physical(window['pressure'])
+        return window